@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Application context for VimWizards.
+Every SSH login spawns a fresh interpreter, so anything shared between
+screens (the blessed Terminal, the frame writer, the idle monitor and the
+ASCII art) is created once here instead of on every trip through the menu.
+"""
+
+import os
+
+from blessed import Terminal
+
+from idle import STATE_DIR, IdleMonitor
+from output import FrameWriter
+
+ASSET_DIR = "assets/ascii"
+
+# Time allowed from interpreter launch to the first menu frame, in seconds
+STARTUP_BUDGET = 0.25
+
+
+class AppContext:
+    """Shared terminal, frame writer and preloaded assets for a single process."""
+
+    def __init__(self, asset_dir: str = ASSET_DIR):
+        self.term = Terminal()
+        self.writer = FrameWriter(self.term.stream)
+        self.idle = IdleMonitor(self.term, self.writer)
+        self._asset_dir = asset_dir
+        self.logo = self.load_asset("logo.txt", "[Logo file not found]")
+        self.game_over_art = self.load_asset("game_over.txt", "GAME OVER")
+
+    def load_asset(self, name: str, fallback: str) -> str:
+        """Read an ASCII art file, returning fallback if it can't be read."""
+        try:
+            with open(os.path.join(self._asset_dir, name), "r", encoding="utf-8") as file:
+                return file.read()
+        except OSError:
+            return fallback
+
+
+def test_startup():
+    """Time a fresh interpreter from launch until the first menu frame is drawn."""
+    import pty
+    import signal
+    import sys
+    import time
+
+    start = time.perf_counter()
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.execv(sys.executable, [sys.executable, "main.py"])
+
+    output = b""
+    elapsed = None
+    try:
+        while elapsed is None:
+            try:
+                chunk = os.read(fd, 4096)
+            except OSError:
+                break
+            if not chunk:
+                break
+            output += chunk
+            if b"Use j/k to navigate" in output:
+                elapsed = time.perf_counter() - start
+    finally:
+        # Hang up like a dropped SSH connection would
+        os.kill(pid, signal.SIGHUP)
+        _, status = os.waitpid(pid, 0)
+
+    if elapsed is None:
+        print("Menu was never drawn")
+        return
+
+    assert os.WIFEXITED(status), "Session was killed by the hangup instead of exiting"
+    assert not os.path.exists(os.path.join(STATE_DIR, f"{pid}.state")), \
+        "Hung up session left its state file behind"
+
+    print(f"Startup to first menu frame: {elapsed * 1000:.1f} ms (budget {STARTUP_BUDGET * 1000:.0f} ms)")
+    assert elapsed <= STARTUP_BUDGET, "Startup time is over budget"
+
+
+if __name__ == "__main__":
+    test_startup()
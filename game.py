@@ -1,6 +1,10 @@
 import random
+from collections import deque
 from random import randrange
 
+# Portal pairs a wizard can have open at once
+MAX_PORTALS = 3
+
 
 class Arena:
     def __init__(self, size=10):
@@ -13,6 +17,10 @@ class Arena:
         ]
         self._top_down_border = f"   +{'-' * (self._column_size + 2)}+\n"
         self._rendered_objects_percentage = 2
+        # Portal cells: position -> [portals on the cell, symbol beneath them]
+        self._portal_cells = {}
+        # Positions whose cell changed since take_changes(), when tracking
+        self._changes = None
 
     @property
     def arena(self):
@@ -24,14 +32,62 @@ class Arena:
         self._arena = value
 
     def render_object_to_arena(self, position, symbol):
-        x, y = position
-        self._arena[y][x] = symbol
+        # Portals stay on top; whatever is drawn under one shows once it closes
+        cell = self._portal_cells.get(position)
+        if cell:
+            cell[1] = symbol
+            return
+        self._set_cell(position, symbol)
 
     def clean_up_wizard(self, position):
+        self.render_object_to_arena(position, ".")
+
+    def add_portal(self, position, symbol):
+        cell = self._portal_cells.get(position)
+        if cell:
+            # Two pairs can share a cell
+            cell[0] += 1
+            return
+        x, y = position
+        self._portal_cells[position] = [1, self._arena[y][x]]
+        self._set_cell(position, symbol)
+
+    def remove_portal(self, position):
+        cell = self._portal_cells[position]
+        cell[0] -= 1
+        if cell[0] == 0:
+            del self._portal_cells[position]
+            self._set_cell(position, cell[1])
+
+    def _set_cell(self, position, symbol):
         x, y = position
-        self._arena[y][x] = "."
+        row = self._arena[y]
+        if self._changes is not None and row[x] != symbol:
+            self._changes.add(position)
+        row[x] = symbol
+
+    def track_changes(self):
+        """Start recording which cells change, for sending deltas instead of whole frames."""
+        self._changes = set()
+
+    def take_changes(self):
+        """Positions that changed since the last call, cleared for the next one."""
+        changes = self._changes
+        self._changes = set()
+        return changes
+
+    def portal_cells(self):
+        """(position, symbol beneath the portal) for each cell with a portal on it."""
+        return [(position, cell[1]) for position, cell in self._portal_cells.items()]
 
     def __repr__(self) -> str:
+        return self.render()
+
+    def render(self, render_row=None) -> str:
+        # render_row turns a row of cells into text, e.g. to add color
+        if render_row is None:
+            render_row = "".join
+
         # 4 empty space characters
         render = "     "
 
@@ -51,8 +107,7 @@ class Arena:
 
             render += f"{ln} | "
 
-            for c in range(self._column_size):
-                render += self._arena[r][c]
+            render += render_row(self._arena[r])
 
             render += " |\n"
 
@@ -60,6 +115,107 @@ class Arena:
         return render
 
 
+class PortalPair:
+    def __init__(self, entry, exit):
+        self.entry = entry
+        self.exit = exit
+        # Tail segments that still have to pass through this pair, not
+        # counting the ones queued behind an older pair
+        self.segments = 0
+
+
+class PortalManager:
+    """
+    Open portal pairs, oldest first. The tail drains through them in order,
+    so each pair only counts the segments between it and the pair before,
+    and a pop or a close only ever looks at the front of the queue.
+    """
+
+    def __init__(self, arena, symbol="@"):
+        self._arena = arena
+        self._symbol = symbol
+        self._pairs = deque()
+        # Segments added since the newest pair's entry
+        self._unassigned = 0
+        # The pair the wizard is stepping through right now
+        self._opening = None
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def __iter__(self):
+        return iter(self._pairs)
+
+    @property
+    def unassigned(self):
+        return self._unassigned
+
+    def open(self, entry, exit, segments=None):
+        """
+        Open a pair. Segments already in the tail are behind it, and so is
+        anything added until the wizard has stepped through (stepped()).
+        """
+        pair = PortalPair(entry, exit)
+        if segments is None:
+            pair.segments = self._unassigned
+            self._unassigned = 0
+            self._opening = pair
+        else:
+            # Restoring a saved pair
+            pair.segments = segments
+
+        self._pairs.append(pair)
+        self._arena.add_portal(entry, self._symbol)
+        self._arena.add_portal(exit, self._symbol)
+        return pair
+
+    def stepped(self):
+        """The wizard has finished moving; new segments are no longer behind the newest pair."""
+        self._opening = None
+
+    def segment_added(self):
+        if self._opening is not None:
+            self._opening.segments += 1
+        else:
+            self._unassigned += 1
+
+    def segment_removed(self):
+        # The oldest segment belongs to the oldest pair it hasn't drained from
+        for pair in self._pairs:
+            if pair.segments:
+                pair.segments -= 1
+                return
+        self._unassigned -= 1
+
+    def close_drained(self, position):
+        """Close pairs the tail has fully passed through, unless the wizard is standing on the exit."""
+        while self._pairs:
+            pair = self._pairs[0]
+            if pair.segments or pair is self._opening or pair.exit == position:
+                break
+            self.close(pair)
+
+    def close(self, pair):
+        """Close a pair whether or not the tail has drained through it."""
+        index = self._pairs.index(pair)
+        del self._pairs[index]
+
+        # Its segments are still behind the next pair
+        if index < len(self._pairs):
+            self._pairs[index].segments += pair.segments
+        else:
+            self._unassigned += pair.segments
+        if pair is self._opening:
+            self._opening = None
+
+        self._arena.remove_portal(pair.entry)
+        self._arena.remove_portal(pair.exit)
+
+    def close_all(self):
+        while self._pairs:
+            self.close(self._pairs[-1])
+
+
 class Wizard:
     def __init__(self, x, y, arena):
         self._symbol = "W"
@@ -69,9 +225,8 @@ class Wizard:
         self._crystals = 0
         self._tail = []
         self._tail_symbol = "o"
-        self._portal_entry = None
-        self._portal_exit = None
         self._portal_symbol = "@"
+        self._portals = PortalManager(arena, self._portal_symbol)
 
         self.render_wizard_to_arena()
 
@@ -88,11 +243,11 @@ class Wizard:
         if self._tail:
             # Clean up the last tail segment
             if len(self._tail) >= self._crystals:
-                last_segment = self._tail.pop()
+                last_segment = self._remove_segment()
                 self._arena.clean_up_wizard(last_segment)
 
             # Add current position to front of tail
-            self._tail.insert(0, self.position)
+            self._add_segment(self.position)
 
             # Render the tail
             for segment in self._tail:
@@ -100,12 +255,7 @@ class Wizard:
 
         self._x, self._y = position
         self.render_wizard_to_arena()
-
-        # Re-render portals if they exist (in case they were overwritten)
-        if self._portal_entry:
-            self._arena.render_object_to_arena(self._portal_entry, self._portal_symbol)
-        if self._portal_exit:
-            self._arena.render_object_to_arena(self._portal_exit, self._portal_symbol)
+        self._portals.stepped()
 
         # TODO: place in a Arena object helper function
         objects_rendered = len(self._tail) + 2
@@ -116,11 +266,23 @@ class Wizard:
     def crystals(self):
         return self._crystals
 
+    @property
+    def portals(self):
+        return self._portals
+
+    def _add_segment(self, position):
+        self._tail.insert(0, position)
+        self._portals.segment_added()
+
+    def _remove_segment(self):
+        self._portals.segment_removed()
+        return self._tail.pop()
+
     def collect_crystals(self, crystal):
         self._crystals += 1
         # When collecting a crystal, add current position to tail
         if self.position not in self._tail:
-            self._tail.insert(0, self.position)
+            self._add_segment(self.position)
 
         crystal.spawn(self)
 
@@ -134,30 +296,29 @@ class Wizard:
         return self.position in self._tail
 
     def has_active_portal(self):
-        return self._portal_entry is not None or self._portal_exit is not None
+        return len(self._portals) > 0
+
+    def can_open_portal(self):
+        return len(self._portals) < MAX_PORTALS
 
     def create_portal(self, from_pos, to_pos, crystal):
-        self._portal_entry = from_pos
-        self._portal_exit = to_pos
-        # Render portals
-        self._arena.render_object_to_arena(from_pos, self._portal_symbol)
-        self._arena.render_object_to_arena(to_pos, self._portal_symbol)
-        
+        self._portals.open(from_pos, to_pos)
+
         if to_pos == crystal.position:
            self.collect_crystals(crystal)
 
 
     def check_portal_clear(self):
-        # Check if all tail segments have passed through the portal
-        if self._portal_entry and self._portal_exit:
-            # Portal is clear when no tail segments are at the entry position
-            # and wizard is not at the exit position
-            if self._portal_entry not in self._tail and self.position != self._portal_exit:
-                # Clean up portals
-                self._arena.clean_up_wizard(self._portal_entry)
-                self._arena.clean_up_wizard(self._portal_exit)
-                self._portal_entry = None
-                self._portal_exit = None
+        # A pair closes once every tail segment behind it has passed through
+        # and the wizard has stepped off the exit
+        self._portals.close_drained(self.position)
+
+    def close_portal(self, pair=None):
+        # Close one pair, or all of them, whether or not the tail has drained
+        if pair is None:
+            self._portals.close_all()
+        else:
+            self._portals.close(pair)
 
 
 class Crystal:
@@ -205,6 +366,11 @@ class Crystal:
 
         self.position = random.choice(spawn_points)
 
+    def relocate(self, wizard: Wizard):
+        # Move the crystal somewhere else without it being collected
+        self._arena.clean_up_wizard(self.position)
+        self.spawn(wizard)
+
     def render_crystal_to_arena(self):
         self._arena.render_object_to_arena(self.position, self._symbol)
 
@@ -217,5 +383,69 @@ def test():
     print(arena)
 
 
+def test_portals():
+    """Random walks with teleports, checking the portal counts against the tail."""
+    import timeit
+
+    rng = random.Random(3)
+    for _ in range(200):
+        arena = Arena(size=12)
+        wizard = Wizard(0, 0, arena)
+        crystal = Crystal(22, 11, arena)
+        wizard._crystals = 8
+        wizard._add_segment(wizard.position)
+
+        for _ in range(300):
+            x, y = wizard.position
+            if wizard.can_open_portal() and rng.random() < 0.2:
+                target = (rng.choice([0, 22]), y)
+                if target == wizard.position or target in wizard._tail:
+                    continue
+                wizard.create_portal(wizard.position, target, crystal)
+            else:
+                steps = [
+                    (x + dx, y + dy) for dx, dy in ((-2, 0), (2, 0), (0, -1), (0, 1))
+                    if 0 <= x + dx <= 22 and 0 <= y + dy <= 11 and (x + dx, y + dy) not in wizard._tail
+                ]
+                if not steps:
+                    break
+                target = rng.choice(steps)
+
+            wizard.position = target
+            if wizard.collision(crystal):
+                wizard.collect_crystals(crystal)
+            wizard.check_portal_clear()
+
+            portals = list(wizard.portals)
+            assert sum(pair.segments for pair in portals) + wizard.portals.unassigned == len(wizard._tail)
+            assert len(portals) <= MAX_PORTALS
+            if portals and portals[0].segments:
+                assert portals[0].entry in wizard._tail
+            for pair in portals:
+                assert arena.arena[pair.entry[1]][pair.entry[0]] == "@"
+                assert arena.arena[pair.exit[1]][pair.exit[0]] == "@"
+
+        # Closing restores whatever was drawn under the portals
+        wizard.close_portal()
+        assert not arena.portal_cells()
+        assert arena.arena[wizard._y][wizard._x] == "W"
+        assert all(arena.arena[y][x] == "o" for x, y in wizard._tail if (x, y) != wizard.position)
+
+    # Per-move close check with three pairs open and a long tail
+    arena = Arena(size=40)
+    wizard = Wizard(0, 0, arena)
+    wizard._tail = [(x, y) for y in range(1, 40) for x in range(0, 78, 2)]
+    for row in (10, 20, 30):
+        wizard.portals.open((0, row), (78, row), segments=len(wizard._tail) // 3)
+    runs = 10000
+    counted = timeit.timeit(wizard.check_portal_clear, number=runs) / runs * 1e6
+    scanned = timeit.timeit(
+        lambda: [pair.entry not in wizard._tail for pair in wizard.portals], number=runs
+    ) / runs * 1e6
+    print(f"Close check, {len(wizard._tail)} tail segments: {counted:.2f} us counted, {scanned:.2f} us scanning the tail")
+    print("Portal test passed.")
+
+
 if __name__ == "__main__":
     test()
+    test_portals()
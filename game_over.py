@@ -4,48 +4,39 @@ Game Over screen module for VimWizards.
 Handles the game over display, initials input, and score saving using blessed terminal.
 """
 
-from datetime import datetime
-from blessed import Terminal
-from database import save_high_score
+from output import CLEAR_SCREEN
 
 
 class GameOverScreen:
     """Handles the game over screen display and user input."""
     
-    def __init__(self):
-        """Initialize the game over screen with terminal."""
-        self.term = Terminal()
+    def __init__(self, context):
+        """Initialize the game over screen with the shared terminal and art."""
+        self.term = context.term
+        self.writer = context.writer
+        self.idle = context.idle
+        self.ascii_art = context.game_over_art
     
-    def load_ascii_art(self):
-        """Load the ASCII art from file."""
-        try:
-            with open("assets/ascii/game_over.txt", 'r', encoding='utf-8') as file:
-                return file.read()
-        except FileNotFoundError:
-            return "GAME OVER"
-        except Exception:
-            return "GAME OVER"
-    
-    def clear_screen(self):
-        """Clear the terminal screen using ANSI escape sequences."""
-        print('\033[2J\033[3J\033[H', end='', flush=True)
-    
-    def display_game_over(self, score, message=""):
-        """Display the game over screen with ASCII art and score."""
-        self.clear_screen()
-        
-        # Show ASCII art
-        ascii_art = self.load_ascii_art()
-        print(ascii_art)
-        
-        # Show score
-        print(f"\tFinal Score: {score}")
-        print()
-        
+    def display_game_over(self, score, message="", footer=()):
+        """Display the game over screen with ASCII art, score and any footer lines."""
+        lines = [
+            # Show ASCII art
+            self.ascii_art,
+
+            # Show score
+            f"\tFinal Score: {score}",
+            "",
+        ]
+
         # Show additional message if provided
         if message:
-            print(f"\t{message}")
-            print()
+            lines.append(f"\t{message}")
+            lines.append("")
+
+        lines.extend(footer)
+
+        # Clear screen and draw the whole screen in a single write
+        self.writer.write(CLEAR_SCREEN + "".join(f"{line}\n" for line in lines))
     
     def get_player_initials(self):
         """
@@ -55,15 +46,17 @@ class GameOverScreen:
         initials = ""
         
         while True:
-            self.display_game_over(0, "Enter your initials (3 characters):")
-            print(f"\tInitials: {initials}_")
-            print()
-            print("\tEnter 3 letters for your initials")
+            footer = [
+                f"\tInitials: {initials}_",
+                "",
+                "\tEnter 3 letters for your initials",
+            ]
             if len(initials) == 3:
-                print("\tPress Enter to submit or Backspace to edit")
+                footer.append("\tPress Enter to submit or Backspace to edit")
+            self.display_game_over(0, "Enter your initials (3 characters):", footer)
             
             with self.term.cbreak():
-                key = self.term.inkey()
+                key = self.idle.inkey("game_over")
                 
                 if key.name == 'KEY_ESCAPE':
                     # User pressed Escape, cancel entry
@@ -84,14 +77,15 @@ class GameOverScreen:
                     # Auto-submit when we reach 3 characters and user presses Enter
                     if len(initials) == 3:
                         # Show the completed initials
-                        self.display_game_over(0, "Enter your initials (3 characters):")
-                        print(f"\tInitials: {initials}")
-                        print()
-                        print("\tPress Enter to submit or Backspace to edit")
+                        self.display_game_over(0, "Enter your initials (3 characters):", [
+                            f"\tInitials: {initials}",
+                            "",
+                            "\tPress Enter to submit or Backspace to edit",
+                        ])
                         
                         # Wait for Enter or continue editing
                         with self.term.cbreak():
-                            next_key = self.term.inkey()
+                            next_key = self.idle.inkey("game_over")
                             if next_key.name == 'KEY_ENTER' or next_key == '\r' or next_key == '\n':
                                 return initials.upper()
                             elif next_key.name == 'KEY_BACKSPACE' or next_key == '\x7f':
@@ -101,14 +95,18 @@ class GameOverScreen:
     
     def save_score(self, initials, score):
         """Save the score to the database."""
+        # Imported here so sqlite3 isn't loaded until a score is saved
+        from datetime import datetime
+        from database import save_high_score
+
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         return save_high_score(initials, score, current_date)
     
-    def wait_for_continue(self, message="Press any key to continue..."):
-        """Wait for user to press any key."""
-        print(f"\t{message}")
+    def show_and_wait(self, score, message="", prompt="Press any key to continue..."):
+        """Display the game over screen with a prompt and wait for user to press any key."""
+        self.display_game_over(score, message, [f"\t{prompt}"])
         with self.term.cbreak():
-            self.term.inkey()
+            self.idle.inkey("game_over")
     
     def show(self, score):
         """
@@ -118,16 +116,14 @@ class GameOverScreen:
             score: The player's final score
         """
         # Show initial game over screen
-        self.display_game_over(score)
-        self.wait_for_continue()
+        self.show_and_wait(score)
         
         # Get player initials
         initials = self.get_player_initials()
         
         # If user cancelled, don't save score
         if not initials:
-            self.display_game_over(score, "Score not saved.")
-            self.wait_for_continue()
+            self.show_and_wait(score, "Score not saved.")
             return
         
         # Save score to database
@@ -139,15 +135,16 @@ class GameOverScreen:
         else:
             message = "Error saving score to database."
         
-        self.display_game_over(score, message)
-        self.wait_for_continue()
+        self.show_and_wait(score, message)
 
 
 def test_game_over():
     """Test the game over functionality."""
+    from context import AppContext
+
     print("Testing Game Over screen...")
-    game_over = GameOverScreen()
-    game_over.show_game_over(42)
+    game_over = GameOverScreen(AppContext())
+    game_over.show(42)
     print("Game Over test completed.")
 
 
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Idle session detection for VimWizards.
+Every input point waits for keys through IdleMonitor, which asks an idle
+player if they are still there and tears the session down if nobody
+answers. Each process also keeps a small state file so the host can count
+and cull sessions without poking at the processes themselves.
+"""
+
+import os
+import select
+import time
+
+from blessed.keyboard import Keystroke
+
+from output import compose
+
+# Seconds without a keypress before asking "still there?", per input point.
+# Override with VIMWIZARDS_IDLE_<POINT>, e.g. VIMWIZARDS_IDLE_GAME=600; 0 disables.
+IDLE_TIMEOUTS = {
+    "menu": 120,
+    "game": 300,
+    "game_over": 120,
+}
+# Seconds to answer the prompt before the session is closed.
+# Override with VIMWIZARDS_IDLE_PROMPT.
+PROMPT_TIMEOUT = 30
+
+STATE_DIR = "./data/sessions"
+# Seconds between rewrites of the state file to refresh the output stats
+STATS_INTERVAL = 10
+
+
+class IdleTimeout(Exception):
+    """Raised when an idle player didn't answer the "still there?" prompt."""
+
+
+def configured_timeout(name, default):
+    """A timeout from VIMWIZARDS_IDLE_<NAME>, or default if it isn't set."""
+    value = os.environ.get(f"VIMWIZARDS_IDLE_{name.upper()}")
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Ignoring invalid idle timeout for {name}: {value}")
+        return default
+
+
+class IdleMonitor:
+    """Wraps term.inkey() with idle timeouts and tracks the session's idle/active state."""
+
+    def __init__(self, term, writer, timeouts=None, prompt_timeout=None,
+                 state_dir=STATE_DIR, clock=time.monotonic):
+        self._term = term
+        self._writer = writer
+        if timeouts is None:
+            timeouts = {
+                point: configured_timeout(point, default)
+                for point, default in IDLE_TIMEOUTS.items()
+            }
+        if prompt_timeout is None:
+            prompt_timeout = configured_timeout("prompt", PROMPT_TIMEOUT)
+        self._timeouts = timeouts
+        self._prompt_timeout = prompt_timeout
+        self._clock = clock
+        self._last_activity = clock()
+        self._state = None
+        self._since = None
+        self._stats_written_at = None
+        self._stats_bytes = 0
+
+        self.state_path = None
+        if state_dir:
+            self.state_path = os.path.join(state_dir, f"{os.getpid()}.state")
+        self.set_state("active")
+
+    @property
+    def state(self):
+        return self._state
+
+    def set_state(self, state):
+        """
+        Record the session state as "<state> <pid> <since>" in the state file,
+        followed by the frame writer's stats as key=value pairs and
+        recent_bytes_per_second, the output rate since the previous write.
+        Only written when the state changes, or every STATS_INTERVAL
+        seconds from inkey(), never per keypress.
+        """
+        if state == self._state:
+            return
+        self._state = state
+        self._since = int(time.time())
+        self._write_state()
+
+    def _write_state(self):
+        # The writer's bytes_per_second covers the whole session, which
+        # hides a link that has only just started struggling
+        now = self._clock()
+        stats = self._writer.stats()
+        elapsed = now - self._stats_written_at if self._stats_written_at is not None else 0
+        recent = stats["bytes_written"] - self._stats_bytes
+        stats["recent_bytes_per_second"] = recent / elapsed if elapsed > 0 else 0.0
+        self._stats_written_at = now
+        self._stats_bytes = stats["bytes_written"]
+        if not self.state_path:
+            return
+
+        stats = " ".join(
+            f"{name}={value:.0f}" if isinstance(value, float) else f"{name}={value}"
+            for name, value in stats.items()
+        )
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            temp_path = self.state_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                file.write(f"{self._state} {os.getpid()} {self._since} {stats}\n")
+            os.replace(temp_path, self.state_path)
+        except OSError:
+            # The state file is only a hint for the host
+            pass
+
+    def close(self):
+        """Remove the state file when the session ends."""
+        self._state = None
+        if self.state_path:
+            try:
+                os.remove(self.state_path)
+            except FileNotFoundError:
+                pass
+
+    def inkey(self, point, timeout=None, wake=None):
+        """
+        Wait for a key like term.inkey(), asking "still there?" once the
+        player has been idle for the input point's timeout.
+
+        Args:
+            point: Input point name, a key of IDLE_TIMEOUTS
+            timeout: Seconds to wait for a key, None to wait indefinitely
+            wake: Optional file or socket; stop waiting when it becomes readable
+
+        Returns:
+            The key, or an empty Keystroke if timeout expired, wake became
+            readable or the player just answered the prompt (the screen has
+            been redrawn)
+
+        Raises:
+            IdleTimeout: If nobody answered the prompt
+        """
+        idle_timeout = self._timeouts.get(point)
+        deadline = None if timeout is None else self._clock() + timeout
+
+        while True:
+            now = self._clock()
+            if now - self._stats_written_at >= STATS_INTERVAL:
+                self._write_state()
+            # Wake up for the next refresh even when nothing else is due
+            wait = max(0.0, self._stats_written_at + STATS_INTERVAL - now)
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - now))
+
+            if idle_timeout:
+                idle_at = self._last_activity + idle_timeout
+                if now >= idle_at:
+                    self.still_there()
+                    return Keystroke("")
+                wait = min(wait, idle_at - now)
+
+            if wake is None:
+                key = self._term.inkey(timeout=wait)
+            else:
+                key, woken = self._inkey_or_wake(wait, wake)
+                if woken:
+                    return key
+            if key:
+                self._last_activity = self._clock()
+                return key
+
+            if deadline is not None and self._clock() >= deadline:
+                return key
+
+    def _inkey_or_wake(self, wait, wake):
+        """term.inkey(), giving up early if wake becomes readable first."""
+        # Keys blessed has already read off the terminal don't show up in select()
+        key = self._term.inkey(timeout=0)
+        if key:
+            return key, False
+
+        keyboard = getattr(self._term, "_keyboard_fd", None)
+        ready, _, _ = select.select([wake] if keyboard is None else [wake, keyboard], [], [], wait)
+        if keyboard is not None and keyboard in ready:
+            key = self._term.inkey(timeout=0)
+        return key, wake in ready and not key
+
+    def still_there(self):
+        """Prompt the idle player and wait for any key, or raise IdleTimeout."""
+        self.set_state("idle")
+        last_frame = self._writer.last_frame
+
+        self._writer.write(compose(
+            "",
+            "\tStill there?",
+            "",
+            f"\tPress any key within {self._prompt_timeout:.0f} seconds to keep playing",
+        ))
+
+        if not self._term.inkey(timeout=self._prompt_timeout):
+            raise IdleTimeout()
+
+        self._last_activity = self._clock()
+        self.set_state("active")
+
+        # Put back whatever the player was looking at
+        if last_frame:
+            self._writer.write(last_frame)
+
+
+def test_idle_monitor():
+    """Test the idle prompt with a fake terminal and clock."""
+    import io
+    import tempfile
+    from output import FrameWriter
+
+    now = [0.0]
+
+    class FakeTerminal:
+        def __init__(self, keys):
+            self.keys = list(keys)
+            self.waits = []
+
+        def inkey(self, timeout=None):
+            self.waits.append(timeout)
+            # Nobody types: time passes until the timeout
+            key = self.keys.pop(0) if self.keys else ""
+            if not key and timeout is not None:
+                now[0] += timeout
+            return Keystroke(key)
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        writer = FrameWriter(io.StringIO())
+        writer.write(compose("menu"))
+        term = FakeTerminal(["", "x"])
+        monitor = IdleMonitor(term, writer, timeouts={"menu": 10}, prompt_timeout=5,
+                              state_dir=state_dir, clock=lambda: now[0])
+
+        # Idle for 10 seconds, then answers the prompt
+        assert monitor.inkey("menu") == ""
+        assert "Still there?" in writer._stream.getvalue()
+        assert writer.last_frame == compose("menu")
+        assert monitor.state == "active"
+
+        # Timeouts shorter than the idle timeout just return
+        term.keys = [""]
+        assert monitor.inkey("menu", timeout=1) == ""
+
+        # Idle again and nobody answers
+        term.keys = []
+        try:
+            monitor.inkey("menu")
+        except IdleTimeout:
+            pass
+        else:
+            raise AssertionError("Idle session was not timed out")
+
+        with open(monitor.state_path, encoding="utf-8") as file:
+            state = file.read()
+        assert state.startswith("idle ")
+        assert "bytes_per_second=" in state and "dropped_frames=0" in state
+        monitor.close()
+        assert not os.path.exists(monitor.state_path)
+
+        # A long idle timeout still wakes up to refresh the stats, which
+        # show the output rate since the previous refresh
+        term = FakeTerminal(["", "x"])
+        monitor = IdleMonitor(term, writer, timeouts={"game": 300}, prompt_timeout=5,
+                              state_dir=state_dir, clock=lambda: now[0])
+        writer.write("x" * 1000)
+        assert monitor.inkey("game") == "x"
+        assert term.waits[0] == STATS_INTERVAL
+        with open(monitor.state_path, encoding="utf-8") as file:
+            assert f"recent_bytes_per_second={1000 / STATS_INTERVAL:.0f}" in file.read()
+
+        term.keys = ["", "x"]
+        assert monitor.inkey("game") == "x"
+        with open(monitor.state_path, encoding="utf-8") as file:
+            assert "recent_bytes_per_second=0" in file.read()
+        monitor.close()
+
+    print("Idle monitor test passed.")
+
+
+if __name__ == "__main__":
+    test_idle_monitor()
@@ -3,209 +3,92 @@
 Main entry point for the wizard game
 """
 
-from blessed import Terminal
-
-from game import Arena, Crystal, Wizard
+from context import AppContext
+from session import GameSession
 from menu import Menu
 from game_over import GameOverScreen
-from database import init_database
+from idle import IdleTimeout
+import signal
+import snapshot
+
+def exit_on_hangup():
+    """
+    Turn SIGHUP and SIGTERM into SystemExit, so a dropped connection still
+    runs the finally blocks that restore the terminal and remove the
+    session's state file. save_on_hangup() overrides this during a game.
+    """
+    def handler(signum, frame):
+        raise SystemExit(128 + signum)
+
+    for name in ("SIGHUP", "SIGTERM"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handler)
 
 def main():
-    # Initialize database
-    init_database()
-    
-    # Main application loop
-    while True:
-        # Show menu
-        menu = Menu()
-        if not menu.display():
-            print("Thanks for playing!")
-            return
-
-        # Initialize terminal and start game
-        play_game()
-
-def play_game():
-    # Initialize terminal
-    term = Terminal()
-    
-    x,y=0,0
-
-    # Create the game objects
-    arena = Arena(size=10)
-    wizard = Wizard(x, y, arena)
-    crystal = Crystal(4, 4, arena)
-
-    # Number buffer for #G command
-    number_buffer = ""
-    # Command mode buffer
-    command_buffer = ""
-    command_mode = False
-
-    with term.fullscreen(), term.cbreak(), term.hidden_cursor():
-
-        loop = True
-        game_lost = False
-        while loop:
-
-            # Clear the screen
-            print('\033[2J\033[3J\033[H')
-
-            # Show Crystals collected as score
-            print(f"Score: {wizard.crystals}")
-            # print(f"Available: {arena._rendered_objects_percentage}%\n") # For debugging purposes
-
-            # Show the arena
-            print(arena)
-
-            # Display instructions
-            print(f"Press 'h/j/k/l' to move left/down/up/right")
-            print(f"Press '0/$' to teleport leftmost/rightmost")
-            print(f"Press '#G' to teleport to row # (e.g., 5G for row 5)")
-            print(f"Press ':q!' to quit")
-            if number_buffer:
-                print(f"Number buffer: {number_buffer}")
-            if command_mode:
-                print(f":{command_buffer}")
-
-            # Wait for input
-            key = term.inkey()
-
-            # Handle command mode
-            if key == ':' and not command_mode:
-                command_mode = True
-                command_buffer = ""
-            elif command_mode:
-                if key.code == term.KEY_ENTER or key == '\r' or key == '\n':
-                    # Execute command
-                    if command_buffer == "q!":
-                        loop = False
-                    # Clear command mode
-                    command_mode = False
-                    command_buffer = ""
-                elif key.code == term.KEY_ESCAPE or key == '\x1b':
-                    # Exit command mode
-                    command_mode = False
-                    command_buffer = ""
-                elif key.code == term.KEY_BACKSPACE or key == '\x7f' or key == '\b':
-                    # Handle backspace
-                    if command_buffer:
-                        command_buffer = command_buffer[:-1]
-                elif key and not key.is_sequence:
-                    # Add character to command buffer
-                    command_buffer += str(key)
-
-            # Skip all game controls if in command mode
-            elif not command_mode:
-                # Movement vectors as tuples
-                movements = {
-                        'h': (-2, 0), # Left
-                        'l': (2, 0), # Right
-                        'k': (0, -1), #Up
-                        'j': (0, 1) #Down
-                }
-
-                # Movement Handling
-                if key.lower() in movements:
-                    dx, dy = movements[key.lower()]
-                    current_x, current_y = wizard.position
-                    new_x = current_x + dx
-                    new_y = current_y + dy
-                
-                    # Check boundaries
-                    if ( 0 <= new_x <= (arena._size -1) * 2 and
-                        0 <= new_y <= arena._size -1):
-                        # Check if trying to move into the immediate tail segment
-                        if wizard._tail and (new_x, new_y) == wizard._tail[0]:
-                            pass  # Don't allow this move
-                        else:
-                            wizard.position = (new_x, new_y)
-                            
-                            # Check for tail collision
-                            if wizard.collision_with_tail():
-                                game_lost = True
-                                loop = False
-            
-                elif key == '0' and not number_buffer: # Go to start of current row only if buffer is empty
-                    if not wizard.has_active_portal():
-                        old_pos = wizard.position
-                        _, current_y = wizard.position
-                        new_pos = (0, current_y)
-                        
-                        # Only teleport if not moving to same position
-                        if old_pos != new_pos:
-                            wizard.create_portal(old_pos, new_pos, crystal)
-                            wizard.position = new_pos
-                            
-                            # Check for tail collision
-                            if wizard.collision_with_tail():
-                                game_lost = True
-                                loop = False
-
-                elif key == '$': # Go to end of current row
-                    if not wizard.has_active_portal():
-                        old_pos = wizard.position
-                        _, current_y = wizard.position
-                        new_pos = ((arena._size -1) * 2, current_y)
-                        number_buffer = "" # Clear buffer
-                        
-                        # Only teleport if not moving to same position
-                        if old_pos != new_pos:
-                            wizard.create_portal(old_pos, new_pos, crystal)
-                            wizard.position = new_pos
-                            
-                            # Check for tail collision
-                            if wizard.collision_with_tail():
-                                game_lost = True
-                                loop = False
-            
-                # collision detection
-                if wizard.collision(crystal):
-                    # call the crystal re-render method
-                    wizard.collect_crystals(crystal)
-
-                # Handle number input (0-9)
-                elif key.isdigit() and (key != '0' or number_buffer): # Allow 0 if buffer has content
-                    number_buffer += key
-
-                # Handle G command for row teleportation
-                elif key == 'G' and number_buffer:
-                    if not wizard.has_active_portal():
-                        target_row = int(number_buffer) - 1 # Adjusted for zero index
-                        old_pos = wizard.position
-                        current_x, _ = wizard.position
-                        new_pos = (current_x, target_row)
-
-                        # Check if target row is valid and not same position
-                        if 0 <= target_row <= arena._size -1 and old_pos != new_pos:
-                            wizard.create_portal(old_pos, new_pos, crystal)
-                            wizard.position = new_pos
-                            
-                            # Check for tail collision
-                            if wizard.collision_with_tail():
-                                game_lost = True
-                                loop = False
-
-                    number_buffer = "" # Clearing buffer after use of G command
-
-                # Clear buffer on other keys
-                elif key and not key.isdigit():
-                    number_buffer = ""
-            
-            # Check if portal should close (after all movements)
-            wizard.check_portal_clear()
+    exit_on_hangup()
+
+    # Terminal and assets are shared by every screen. The database is
+    # opened on first use (ScoreDatabase creates its table) so sqlite3
+    # stays off the path to the first menu frame.
+    context = AppContext()
+
+    try:
+        # Main application loop
+        while True:
+            # Show menu
+            save_path = snapshot.save_path()
+            menu = Menu(context, can_resume=bool(snapshot.resumable_saves()))
+            if not menu.display():
+                print("Thanks for playing!")
+                return
+
+            # Start game
+            if menu.mode == "versus":
+                # Imported here so sockets and threads stay off the path to the first menu frame
+                import multiplayer
+                multiplayer.play(context)
+            else:
+                play_game(context, menu.mode, save_path)
+    except IdleTimeout:
+        # The terminal modes have been restored on the way out
+        print(context.term.clear + "Session closed after being idle. Come back soon!")
+    finally:
+        context.idle.close()
+
+def play_game(context, mode, save_path):
+    term = context.term
+
+    # Create the game objects, or pick up where a dropped connection left off
+    session = None
+    if mode == "resume":
+        session = snapshot.resume(context, save_path)
+    if session is None:
+        session = GameSession(context, size=10, mode="classic" if mode == "resume" else mode)
+
+    # Save every few moves and when the connection drops
+    session.autosave = snapshot.Autosave(save_path)
+
+    try:
+        with snapshot.save_on_hangup(session, session.autosave):
+            with term.fullscreen(), term.cbreak(), term.hidden_cursor():
+                session.play()
+    except IdleTimeout:
+        # Keep the game so it can be resumed on the next login
+        session.autosave.save(session)
+        raise
+
+    # The game is over one way or another, so there's nothing to resume
+    snapshot.discard(save_path)
 
-    # Clear screen on exit
-    print(term.clear)
-    
     # Handle different exit scenarios
-    if game_lost:
+    if session.game_lost:
         # Show game over screen with initials input
-        game_over_screen = GameOverScreen()
-        game_over_screen.show(wizard.crystals)
+        game_over_screen = GameOverScreen(context)
+        game_over_screen.show(session.wizard.crystals)
         # After game over, return to menu
     else:
-        print("The wizard has left the building")
+        # Clear screen on exit
+        context.writer.write(f"{term.clear}\nThe wizard has left the building\n")
         # Brief pause before returning to menu
         import time
         time.sleep(1)
@@ -3,89 +3,121 @@
 Menu system for VimWizards game
 """
 
-from blessed import Terminal
-from database import get_top_high_scores
+from output import compose
 
 class Menu:
-    def __init__(self):
-        self.term = Terminal()
-        self.logo = self.load_logo("assets/ascii/logo.txt")
-        self.options = ['Start Game', 'High Scores', 'Quit']
+    def __init__(self, context, can_resume=False):
+        self.term = context.term
+        self.writer = context.writer
+        self.idle = context.idle
+        self.logo = context.logo
+        self.options = ['Start Game', 'Real-Time Mode', 'Speed Mode', 'Head to Head', 'High Scores', 'Quit']
+        self.modes = ['classic', 'realtime', 'speed', 'versus']
+        if can_resume:
+            self.options.insert(0, 'Resume Game')
+            self.modes.insert(0, 'resume')
         self.selected = 0
+        self.mode = 'classic'
+        self.high_score_tabs = ['All Time', 'Today', 'Players']
 
-    def load_logo(self,path):
-        try:
-            with open(path, "r", encoding="utf-8") as file:
-                return file.read()
-        except FileNotFoundError:
-            return "[Logo file not found]"
+    def high_score_lines(self, tab):
+        """Table lines for one tab of the high scores screen."""
+        # Imported here so sqlite3 isn't loaded before the first menu frame
+        from database import get_top_high_scores, get_todays_high_scores, get_top_player_stats
+
+        lines = []
+        if tab == 'Players':
+            # Personal bests, from the per-player summary table
+            players = get_top_player_stats(10)
+            if not players:
+                return ["\tNo players yet!", "\tBe the first to set a record!"]
+
+            lines.append(f"\t{'Rank':<6} {'Initials':<10} {'Best':<8} {'Games':<8} {'Average'}")
+            lines.append("\t" + "-" * 50)
+            for i, (initials, best, games, average) in enumerate(players, 1):
+                lines.append(f"\t{i:<6} {initials:<10} {best:<8} {games:<8} {average:.1f}")
+            return lines
+
+        # Get top 10 scores, all time or from today's summary table
+        if tab == 'Today':
+            scores = get_todays_high_scores(10)
+        else:
+            scores = get_top_high_scores(10)
+
+        if not scores:
+            if tab == 'Today':
+                return ["\tNo high scores today!", "\tBe the first to set a record!"]
+            return ["\tNo high scores yet!", "\tBe the first to set a record!"]
+
+        lines.append(f"\t{'Rank':<6} {'Initials':<10} {'Score':<10} {'Date'}")
+        lines.append("\t" + "-" * 50)
+
+        for i, (initials, score, date) in enumerate(scores, 1):
+            # Format date to show just the date part (YYYY-MM-DD)
+            formatted_date = date.split()[0] if ' ' in date else date
+            lines.append(f"\t{i:<6} {initials:<10} {score:<10} {formatted_date}")
+        return lines
 
     def display_high_scores(self):
-        """Display the high scores screen."""
+        """Display the high scores screen, one leaderboard per tab."""
+        tab = 0
         with self.term.cbreak(), self.term.hidden_cursor():
             while True:
-                # Clear screen
-                print('\033[2J\033[3J\033[H')
-                
-                # Display header
-                print("\tHIGH SCORES")
-                print("\t" + "=" * 50)
-                print()
-                
-                # Get top 10 scores
-                scores = get_top_high_scores(10)
-                
-                if not scores:
-                    print("\tNo high scores yet!")
-                    print("\tBe the first to set a record!")
-                else:
-                    print(f"\t{'Rank':<6} {'Initials':<10} {'Score':<10} {'Date'}")
-                    print("\t" + "-" * 50)
-                    
-                    for i, (initials, score, date) in enumerate(scores, 1):
-                        # Format date to show just the date part (YYYY-MM-DD)
-                        formatted_date = date.split()[0] if ' ' in date else date
-                        print(f"\t{i:<6} {initials:<10} {score:<10} {formatted_date}")
-                
-                print()
-                print("\tPress any key to return to main menu...")
-                
-                # Wait for any key press
-                self.term.inkey()
-                return
+                # Display header with the selected tab highlighted
+                tabs = "  ".join(
+                    f"[{name}]" if i == tab else f" {name} "
+                    for i, name in enumerate(self.high_score_tabs)
+                )
+                lines = [
+                    "\tHIGH SCORES",
+                    "\t" + "=" * 50,
+                    f"\t{tabs}",
+                    "",
+                ]
+                lines.extend(self.high_score_lines(self.high_score_tabs[tab]))
+                lines.append("")
+                lines.append("\tUse h/l to switch tabs, any other key to return to main menu...")
+                self.writer.write(compose(*lines))
+
+                # Switch tabs or return on any other key press
+                key = self.idle.inkey("menu")
+                if key.lower() == 'h':
+                    tab = (tab - 1) % len(self.high_score_tabs)
+                elif key.lower() == 'l':
+                    tab = (tab + 1) % len(self.high_score_tabs)
+                elif key:
+                    return
 
     def display(self):
         # Display the menu and handle user input
         with self.term.cbreak(), self.term.hidden_cursor():
             while True:
-                # Clear screen
-                print('\033[2J\033[3J\033[H')
-
                 # Display logo
-                print(self.logo)
-                print()
+                lines = [self.logo, ""]
 
                 # Display menu options
                 for i, option in enumerate(self.options):
                     if i == self.selected:
-                        print(f"\t\t> {option}")
+                        lines.append(f"\t\t> {option}")
                     else:
-                        print(f"\t\t  {option}")
+                        lines.append(f"\t\t  {option}")
 
-                print()
-                print("\tUse j/k to navigate, Enter to select")
+                lines.append("")
+                lines.append("\tUse j/k to navigate, Enter to select")
+                self.writer.write(compose(*lines))
 
                 # Get user input
-                key = self.term.inkey()
+                key = self.idle.inkey("menu")
 
                 if key.lower() == 'j' and self.selected < len(self.options) - 1:
                     self.selected += 1
                 elif key.lower() == 'k' and self.selected > 0:
                     self.selected -= 1
                 elif key.name == 'KEY_ENTER':
-                    if self.selected == 0:  # Start Game
+                    if self.selected < len(self.modes):  # Start Game in the chosen mode
+                        self.mode = self.modes[self.selected]
                         return True
-                    elif self.selected == 1:  # High Scores
+                    elif self.selected == len(self.modes):  # High Scores
                         self.display_high_scores()
                         # Continue the menu loop after returning from high scores
                     else:  # Quit
@@ -0,0 +1,1111 @@
+#!/usr/bin/env python3
+"""
+Head-to-head matches for VimWizards.
+One process owns the match: it advances a single authoritative arena on
+fixed ticks, applies both players' buffered inputs in a fixed order and
+sends each client only the cells that changed on that tick. Clients draw
+what they are sent and never simulate, so they can't disagree. They also
+draw just those cells, with cursor movement, so a tick costs the player's
+SSH link about as much as it cost the socket.
+
+Inputs are stamped with the tick they should apply on, INPUT_DELAY ticks
+after the tick the player was looking at. As long as a player's round trip
+is shorter than that delay their moves land exactly when they expect, and
+both players get the same delay no matter whose link is faster.
+
+Messages (little-endian, no framing beyond the type byte):
+    welcome  "H", player (255 when the match is full), arena size,
+             tick rate, input delay, crystals to win
+    tick     "T", tick, status, both scores, changed cell count,
+             then (cell index, glyph) per changed cell
+    input    "I", tick to apply on, command, argument
+"""
+
+import os
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from game import Arena, Crystal, Wizard
+from output import RETRY_DELAY, compose
+from render import ArenaRenderer
+from scheduler import Scheduler
+from session import MOVEMENTS
+
+SOCKET_PATH = "./data/match.sock"
+
+MATCH_SIZE = 10
+TICK_RATE = 10
+# Ticks between the tick a player saw and the tick their input applies on
+INPUT_DELAY = 2
+WIN_CRYSTALS = 10
+# Inputs a player can have buffered; more are ignored
+MAX_QUEUED_INPUTS = 8
+# Unsent bytes before a slow client is skipped ahead with a full frame
+MAX_CLIENT_BACKLOG = 65536
+# Seconds to finish sending the final tick once a match is over
+CLOSE_TIMEOUT = 2.0
+# Screen row of the arena's first row in a client's frame, below the
+# blank line, the scores, the column letters and the border
+ARENA_TOP = 4
+
+WELCOME = struct.Struct("<cBBBBB")
+TICK = struct.Struct("<cIBBBH")
+CELL = struct.Struct("<HB")
+INPUT = struct.Struct("<cIBB")
+
+MATCH_FULL = 255
+
+WAITING, PLAYING, FIRST_WON, SECOND_WON = range(4)
+
+# Wizard and tail glyphs per player
+PLAYER_GLYPHS = [("W", "o"), ("M", "x")]
+GLYPHS = [".", "W", "o", "@", "♦", "M", "x"]
+GLYPH_CODES = {glyph: code for code, glyph in enumerate(GLYPHS)}
+
+
+class ProtocolError(Exception):
+    """Raised when the other end sends something that isn't a message."""
+
+
+def encode_tick(match, status, positions):
+    """A tick message carrying the current glyph of each position."""
+    size = match.size
+    cells = match.arena.arena
+    parts = [TICK.pack(b"T", match.tick, status, *match.scores(), len(positions))]
+    parts.extend(
+        CELL.pack(y * size + x // 2, GLYPH_CODES[cells[y][x]])
+        for x, y in positions
+    )
+    return b"".join(parts)
+
+
+def read_messages(buffer):
+    """
+    Split the complete messages off the front of buffer.
+
+    Returns:
+        (messages, bytes used); each message is a tuple starting with its type
+    """
+    messages = []
+    offset = 0
+    while offset < len(buffer):
+        kind = buffer[offset:offset + 1]
+        if kind == b"T":
+            if len(buffer) - offset < TICK.size:
+                break
+            _, tick, status, first, second, count = TICK.unpack_from(buffer, offset)
+            end = offset + TICK.size + count * CELL.size
+            if len(buffer) < end:
+                break
+            cells = [
+                CELL.unpack_from(buffer, offset + TICK.size + i * CELL.size)
+                for i in range(count)
+            ]
+            messages.append((b"T", tick, status, (first, second), cells))
+            offset = end
+        elif kind in (b"H", b"I"):
+            layout = WELCOME if kind == b"H" else INPUT
+            if len(buffer) - offset < layout.size:
+                break
+            messages.append(layout.unpack_from(buffer, offset))
+            offset += layout.size
+        else:
+            raise ProtocolError(f"Unknown message type {kind!r}")
+    return messages, offset
+
+
+class Match:
+    """The authoritative state of a head-to-head match, advanced one tick at a time."""
+
+    def __init__(self, size=MATCH_SIZE, win_crystals=WIN_CRYSTALS):
+        self.size = size
+        self.win_crystals = win_crystals
+        self.arena = Arena(size=size)
+        self.wizards = [
+            Wizard(0, 0, self.arena),
+            Wizard((size - 1) * 2, size - 1, self.arena),
+        ]
+        for wizard, (symbol, tail_symbol) in zip(self.wizards, PLAYER_GLYPHS):
+            wizard._symbol = symbol
+            wizard._tail_symbol = tail_symbol
+            wizard.render_wizard_to_arena()
+        self.crystal = Crystal((size // 2) * 2, size // 2, self.arena)
+        self.arena.track_changes()
+
+        self.tick = 0
+        self.status = PLAYING
+        self._inputs = [deque(), deque()]
+        self.late_inputs = 0
+
+    def scores(self):
+        return tuple(wizard.crystals for wizard in self.wizards)
+
+    def winner(self):
+        return None if self.status == PLAYING else self.status - FIRST_WON
+
+    def all_positions(self):
+        """Every cell, for a client that has nothing to apply deltas to."""
+        return [(x, y) for y in range(self.size) for x in range(0, self.size * 2, 2)]
+
+    def queue_input(self, player, tick, command, argument=0):
+        """Buffer a player's input to apply on the given tick, or the next one if it's late."""
+        if self.status != PLAYING:
+            return
+
+        queue = self._inputs[player]
+        if len(queue) >= MAX_QUEUED_INPUTS:
+            return
+        if tick <= self.tick:
+            self.late_inputs += 1
+            tick = self.tick + 1
+        # A player's inputs apply in the order they were sent
+        if queue and queue[-1][0] > tick:
+            tick = queue[-1][0]
+        queue.append((tick, command, argument))
+
+    def step(self):
+        """
+        Advance one tick: apply at most one due input per player and
+        return the positions whose cells changed.
+        """
+        self.tick += 1
+
+        # Take turns going first, so neither player always wins a race for the crystal
+        first = self.tick % 2
+        for player in (first, 1 - first):
+            queue = self._inputs[player]
+            if self.status == PLAYING and queue and queue[0][0] <= self.tick:
+                _, command, argument = queue.popleft()
+                self._apply(player, command, argument)
+
+        for wizard in self.wizards:
+            wizard.check_portal_clear()
+
+        return self.arena.take_changes()
+
+    def forfeit(self, player):
+        if self.status == PLAYING:
+            self.status = FIRST_WON + (1 - player)
+
+    def _apply(self, player, command, argument):
+        wizard = self.wizards[player]
+        x, y = wizard.position
+
+        if command in MOVEMENTS:
+            dx, dy = MOVEMENTS[command]
+            self._move(player, (x + dx, y + dy))
+        elif command == "0":
+            self._teleport(player, (0, y))
+        elif command == "$":
+            self._teleport(player, ((self.size - 1) * 2, y))
+        elif command == "G":
+            if 0 <= argument < self.size:
+                self._teleport(player, (x, argument))
+
+    def _move(self, player, position):
+        wizard = self.wizards[player]
+        x, y = position
+        if not (0 <= x <= (self.size - 1) * 2 and 0 <= y <= self.size - 1):
+            return
+        # Can't turn back into your own neck
+        if wizard._tail and position == wizard._tail[0]:
+            return
+
+        wizard.position = position
+        self._arrived(player)
+
+    def _teleport(self, player, position):
+        wizard = self.wizards[player]
+        if not wizard.can_open_portal() or position == wizard.position:
+            return
+
+        wizard.create_portal(wizard.position, position, self.crystal)
+        wizard.position = position
+        self._arrived(player)
+
+    def _arrived(self, player):
+        wizard = self.wizards[player]
+        other = self.wizards[1 - player]
+
+        # Running into either wizard's tail, or the other wizard, loses
+        if (wizard.collision_with_tail() or wizard.position == other.position
+                or wizard.position in other._tail):
+            self.forfeit(player)
+            return
+
+        if wizard.collision(self.crystal):
+            wizard.collect_crystals(self.crystal)
+        if wizard.crystals >= self.win_crystals:
+            self.status = FIRST_WON + player
+
+
+class _Connection:
+    def __init__(self, sock, player):
+        self.sock = sock
+        self.player = player
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+        # Set when the client fell too far behind; it gets a full frame once caught up
+        self.needs_keyframe = False
+
+
+class MatchServer:
+    """Hosts one match on a Unix socket, ticking the authoritative state and sending deltas."""
+
+    def __init__(self, path=SOCKET_PATH, size=MATCH_SIZE, tick_rate=TICK_RATE,
+                 input_delay=INPUT_DELAY, win_crystals=WIN_CRYSTALS):
+        self.path = path
+        self.match = Match(size=size, win_crystals=win_crystals)
+        self.tick_rate = tick_rate
+        self.input_delay = input_delay
+        self.scheduler = None
+        self._connections = []
+        self._last_sent = None
+        self._closing_at = None
+        self._stopped = False
+
+        # Measurements
+        self.bytes_sent = 0
+        self.ticks_sent = 0
+        self.tick_seconds = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._listener.bind(path)
+        except OSError:
+            self._listener.close()
+            raise
+        self._listener.listen(2)
+        self._listener.setblocking(False)
+
+    @property
+    def status(self):
+        if self.scheduler is None and self.match.status == PLAYING:
+            return WAITING
+        return self.match.status
+
+    def stop(self):
+        """Ask serve() to return; safe to call from another thread."""
+        self._stopped = True
+
+    def stats(self):
+        ticks = self.match.tick
+        return {
+            "ticks": ticks,
+            "bytes_sent": self.bytes_sent,
+            "ticks_sent": self.ticks_sent,
+            "ms_per_tick": self.tick_seconds / ticks * 1000 if ticks else 0.0,
+            "late_inputs": self.match.late_inputs,
+            "dropped_ticks": self.scheduler.dropped_ticks if self.scheduler else 0,
+        }
+
+    def serve(self):
+        """Run until the match is over and the final tick has gone out (or timed out)."""
+        try:
+            while not self._stopped:
+                if self._closing_at is not None:
+                    if not any(c.outbox for c in self._connections) or time.monotonic() >= self._closing_at:
+                        break
+
+                timeout = None
+                if self.scheduler is not None and self.match.status == PLAYING:
+                    timeout = self.scheduler.time_until_next_event()
+                if self._closing_at is not None:
+                    timeout = max(0.0, self._closing_at - time.monotonic())
+                # Wake up now and then so stop() from another thread is noticed
+                timeout = 0.5 if timeout is None else min(timeout, 0.5)
+
+                readers = [self._listener] + [c.sock for c in self._connections]
+                writers = [c.sock for c in self._connections if c.outbox]
+                ready, writable, _ = select.select(readers, writers, [], timeout)
+
+                for sock in ready:
+                    if sock is self._listener:
+                        self._accept()
+                    else:
+                        self._receive(self._connection(sock))
+                for sock in writable:
+                    connection = self._connection(sock)
+                    if connection is not None:
+                        self._flush(connection)
+
+                if self.scheduler is not None and self.match.status == PLAYING:
+                    self.scheduler.advance()
+        finally:
+            for connection in self._connections:
+                connection.sock.close()
+            self._listener.close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _connection(self, sock):
+        for connection in self._connections:
+            if connection.sock is sock:
+                return connection
+        return None
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+
+        taken = {c.player for c in self._connections}
+        free = [player for player in (0, 1) if player not in taken]
+        if not free or self.scheduler is not None:
+            # Only two players, and nobody joins half way through
+            sock.sendall(WELCOME.pack(b"H", MATCH_FULL, 0, 0, 0, 0))
+            sock.close()
+            return
+
+        sock.setblocking(False)
+        connection = _Connection(sock, free[0])
+        self._connections.append(connection)
+        connection.outbox += WELCOME.pack(
+            b"H", connection.player, self.match.size, self.tick_rate,
+            self.input_delay, self.match.win_crystals,
+        )
+        connection.outbox += encode_tick(self.match, self.status, self.match.all_positions())
+
+        if len(self._connections) == 2:
+            self._start()
+        self._flush(connection)
+
+    def _start(self):
+        self.scheduler = Scheduler(tick_rate=self.tick_rate)
+        self.scheduler.schedule(1, self._tick, interval=1)
+        # Tell both players the match is on
+        self._broadcast(encode_tick(self.match, self.status, []))
+
+    def _tick(self):
+        if self.match.status != PLAYING:
+            return
+
+        start = time.perf_counter()
+        changes = self.match.step()
+        state = (self.match.status, self.match.scores())
+        message = None
+        if changes or state != self._last_sent:
+            message = encode_tick(self.match, self.status, changes)
+            self._last_sent = state
+        self.tick_seconds += time.perf_counter() - start
+
+        if message is not None:
+            self._broadcast(message)
+        if self.match.status != PLAYING:
+            self._closing_at = time.monotonic() + CLOSE_TIMEOUT
+
+    def _broadcast(self, message):
+        self.ticks_sent += 1
+        for connection in self._connections:
+            if connection.needs_keyframe:
+                continue
+            if len(connection.outbox) > MAX_CLIENT_BACKLOG:
+                # Deltas pile up on a slow link; skip it ahead with a full frame instead
+                connection.needs_keyframe = True
+                continue
+            connection.outbox += message
+            self._flush(connection)
+
+    def _flush(self, connection):
+        if connection.outbox:
+            try:
+                sent = connection.sock.send(connection.outbox)
+            except BlockingIOError:
+                return
+            except OSError:
+                self._disconnect(connection)
+                return
+            del connection.outbox[:sent]
+            self.bytes_sent += sent
+
+        if not connection.outbox and connection.needs_keyframe:
+            connection.needs_keyframe = False
+            connection.outbox += encode_tick(self.match, self.status, self.match.all_positions())
+            self._flush(connection)
+
+    def _receive(self, connection):
+        if connection is None:
+            return
+        try:
+            data = connection.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._disconnect(connection)
+            return
+
+        connection.inbox += data
+        try:
+            messages, used = read_messages(connection.inbox)
+        except ProtocolError:
+            self._disconnect(connection)
+            return
+        del connection.inbox[:used]
+
+        for message in messages:
+            if message[0] != b"I" or self.scheduler is None:
+                continue
+            _, tick, command, argument = message
+            if chr(command) == "q":
+                # Giving up doesn't wait for a tick
+                self._forfeit(connection.player)
+            else:
+                self.match.queue_input(connection.player, tick, chr(command), argument)
+
+    def _forfeit(self, player):
+        if self.match.status == PLAYING:
+            self.match.forfeit(player)
+            self._broadcast(encode_tick(self.match, self.status, []))
+        if self._closing_at is None:
+            self._closing_at = time.monotonic() + CLOSE_TIMEOUT
+
+    def _disconnect(self, connection):
+        connection.sock.close()
+        self._connections.remove(connection)
+
+        if self.scheduler is None:
+            # Still waiting for an opponent; the seat is free again
+            return
+        # Leaving a match forfeits it
+        self._forfeit(connection.player)
+
+
+def connect(path=SOCKET_PATH):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def connect_or_host(path=SOCKET_PATH):
+    """
+    Connect to the match on path, hosting it in a background thread if
+    nobody is.
+
+    Returns:
+        (socket, MatchServer or None if someone else is hosting)
+    """
+    for _ in range(3):
+        try:
+            return connect(path), None
+        except FileNotFoundError:
+            pass
+        except ConnectionRefusedError:
+            # Left behind by a host that didn't shut down cleanly
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        try:
+            server = MatchServer(path)
+        except OSError:
+            # Somebody else started hosting first
+            continue
+        threading.Thread(target=server.serve, name="match-server", daemon=True).start()
+        return connect(path), server
+
+    raise ConnectionError(f"Couldn't join or host a match on {path}")
+
+
+class MatchClient:
+    """Sends a player's keys to the match and draws the ticks it sends back."""
+
+    def __init__(self, context, sock, clock=time.monotonic):
+        self.term = context.term
+        self.writer = context.writer
+        self.idle = context.idle
+        self.renderer = ArenaRenderer(self.term)
+        self._sock = sock
+        self._sock.setblocking(False)
+        self._clock = clock
+        self._inbox = bytearray()
+
+        self.player = None
+        self.arena = None
+        self.tick_rate = TICK_RATE
+        self.input_delay = INPUT_DELAY
+        self.win_crystals = WIN_CRYSTALS
+        self.status = WAITING
+        self.scores = (0, 0)
+        self.tick = 0
+        self._tick_received_at = clock()
+        self._last_input_tick = 0
+
+        self.number_buffer = ""
+        self.command_buffer = ""
+        self.command_mode = False
+        self.running = True
+        self.disconnected = False
+        self.bytes_received = 0
+
+        # Cells changed since they were drawn, and what the last full frame
+        # showed around the arena
+        self._changed = set()
+        self._redraw = True
+        self._drawn_header = None
+        self._drawn_footer = None
+        self._frames_drawn = None
+
+    def estimated_tick(self):
+        """The tick the server is probably on; it doesn't send ticks where nothing changed."""
+        elapsed = self._clock() - self._tick_received_at
+        return self.tick + int(elapsed * self.tick_rate)
+
+    def send(self, command, argument=0):
+        if self.status != PLAYING:
+            return
+        # Never stamp an input earlier than the one before it
+        tick = max(self.estimated_tick() + self.input_delay, self._last_input_tick)
+        self._last_input_tick = tick
+        try:
+            self._sock.sendall(INPUT.pack(b"I", tick, ord(command), argument))
+        except OSError:
+            self.running = False
+            self.disconnected = True
+
+    def receive(self):
+        """
+        Apply everything the server has sent.
+
+        Returns:
+            True if anything on screen changed
+        """
+        closed = False
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                closed = True
+                break
+            self.bytes_received += len(data)
+            self._inbox += data
+
+        try:
+            messages, used = read_messages(self._inbox)
+        except ProtocolError:
+            messages, used = [], 0
+            closed = True
+        del self._inbox[:used]
+
+        # The final tick usually arrives right before the server hangs up
+        for message in messages:
+            if message[0] == b"H":
+                self._welcome(*message[1:])
+            elif message[0] == b"T":
+                self._apply_tick(*message[1:])
+
+        if closed:
+            self.running = False
+            self.disconnected = True
+        return closed or bool(messages)
+
+    def _welcome(self, player, size, tick_rate, input_delay, win_crystals):
+        if player == MATCH_FULL:
+            self.running = False
+            return
+        self.player = player
+        self.arena = Arena(size=size)
+        self._redraw = True
+        self.tick_rate = tick_rate
+        self.input_delay = input_delay
+        self.win_crystals = win_crystals
+
+    def _apply_tick(self, tick, status, scores, cells):
+        if self.arena is None:
+            return
+        size = self.arena._size
+        rows = self.arena.arena
+        for index, glyph in cells:
+            rows[index // size][(index % size) * 2] = GLYPHS[glyph]
+        if len(cells) == size * size:
+            # A keyframe, cheaper to draw as a whole
+            self._redraw = True
+        else:
+            self._changed.update(index for index, _ in cells)
+
+        if tick != self.tick or status != self.status:
+            self.tick = tick
+            self._tick_received_at = self._clock()
+        self.status = status
+        self.scores = scores
+        if status in (FIRST_WON, SECOND_WON):
+            self.running = False
+
+    def handle_key(self, key):
+        """Turn a keypress into an input for the server, with the same keys as a single-player game."""
+        term = self.term
+
+        if key == ':' and not self.command_mode:
+            self.command_mode = True
+            self.command_buffer = ""
+        elif self.command_mode:
+            if key.code == term.KEY_ENTER or key == '\r' or key == '\n':
+                if self.command_buffer == "q!":
+                    # Quitting forfeits the match
+                    self.send("q")
+                    self.running = False
+                self.command_mode = False
+                self.command_buffer = ""
+            elif key.code == term.KEY_ESCAPE or key == '\x1b':
+                self.command_mode = False
+                self.command_buffer = ""
+            elif key.code == term.KEY_BACKSPACE or key == '\x7f' or key == '\b':
+                self.command_buffer = self.command_buffer[:-1]
+            elif key and not key.is_sequence:
+                self.command_buffer += str(key)
+
+        elif key.lower() in MOVEMENTS:
+            self.send(key.lower())
+        elif key == '0' and not self.number_buffer:
+            self.send("0")
+        elif key == '$':
+            self.number_buffer = ""
+            self.send("$")
+        elif key.isdigit():
+            self.number_buffer += key
+        elif key == 'G' and self.number_buffer:
+            row = int(self.number_buffer) - 1
+            if 0 <= row < 256:
+                self.send("G", row)
+            self.number_buffer = ""
+        elif key:
+            self.number_buffer = ""
+
+    def result(self):
+        """What happened, from this player's point of view."""
+        if self.player is None:
+            return "A match is already in progress, try again later"
+        if self.status in (FIRST_WON, SECOND_WON):
+            if self.status - FIRST_WON == self.player:
+                return "You win!"
+            return "You lose!"
+        if self.disconnected:
+            return "Lost connection to the match"
+        return "You left the match"
+
+    def render(self, full=False):
+        """
+        Draw what changed since the last frame. Cells from ticks and the
+        scores are drawn in place with cursor movement; the whole frame is
+        only composed for keyframes, when the lines under the arena change
+        or when something else (the idle prompt) drew over it.
+
+        Returns:
+            False if changes are waiting for a backed up link
+        """
+        writer = self.writer
+        if self.arena is None:
+            writer.submit(compose("", "\tJoining match..."))
+            self._frames_drawn = writer.frames_written + writer.pending
+            return True
+
+        you, opponent = self.player, 1 - self.player
+        header = (
+            f"You ({PLAYER_GLYPHS[you][0]}): {self.scores[you]}    "
+            f"Opponent ({PLAYER_GLYPHS[opponent][0]}): {self.scores[opponent]}    "
+            f"First to {self.win_crystals} wins"
+        )
+        footer = []
+        if self.status == WAITING:
+            footer.append("Waiting for an opponent to join...")
+        else:
+            footer.append("Press 'h/j/k/l' to move, '0/$' or '#G' to teleport")
+        footer.append("Press ':q!' to quit")
+        if self.number_buffer:
+            footer.append(f"Number buffer: {self.number_buffer}")
+        if self.command_mode:
+            footer.append(f":{self.command_buffer}")
+
+        term = self.term
+        if full or self._redraw or footer != self._drawn_footer or not term.does_styling or self.drawn_over():
+            writer.submit(compose(header, self.renderer.render(self.arena), *footer))
+            # A frame held back now is written by retry(), so count it already
+            self._frames_drawn = writer.frames_written + writer.pending
+            self._redraw = False
+            self._changed.clear()
+            self._drawn_header = header
+            self._drawn_footer = footer
+            return True
+
+        updates = []
+        if header != self._drawn_header:
+            updates.append(term.move_xy(0, 1) + header + term.clear_eol)
+        size = self.arena._size
+        rows = self.arena.arena
+        for index in sorted(self._changed):
+            y, x = divmod(index, size)
+            # Same row labels as Arena.render()
+            column = len(f"{y + 1:>2} | ") + x * 2
+            updates.append(term.move_xy(column, ARENA_TOP + y) + self.renderer.render_cell(rows[y][x * 2]))
+
+        if updates and not writer.update("".join(updates)):
+            return False
+        self._drawn_header = header
+        self._changed.clear()
+        return True
+
+    def drawn_over(self):
+        """True if something else, like the idle prompt, wrote a frame since the client's last one."""
+        return self.writer.frames_written + self.writer.pending != self._frames_drawn
+
+    def run(self):
+        """Draw whenever a tick arrives or a key is pressed, sleeping in select() otherwise."""
+        self.receive()
+        dirty = True
+        while self.running:
+            if dirty:
+                # Whatever the link had no room for is drawn on a later pass
+                dirty = not self.render()
+
+            timeout = self.writer.retry_after()
+            if dirty and timeout is None:
+                timeout = RETRY_DELAY
+            key = self.idle.inkey("game", timeout=timeout, wake=self._sock)
+            if key:
+                self.handle_key(key)
+                dirty = True
+            if self.receive() or self.drawn_over():
+                dirty = True
+
+            if not dirty:
+                self.writer.retry()
+
+        # Show the final position, as a whole frame to put the result under
+        self.render(full=True)
+
+
+def play(context, path=SOCKET_PATH):
+    """Join the head-to-head match, or host one for the next player to join."""
+    term = context.term
+
+    try:
+        sock, server = connect_or_host(path)
+    except OSError as e:
+        context.writer.write(compose("", f"\tCouldn't start a match: {e}"))
+        time.sleep(2)
+        return
+
+    client = MatchClient(context, sock)
+    try:
+        with term.fullscreen(), term.cbreak(), term.hidden_cursor():
+            client.run()
+            context.writer.write(context.writer.last_frame + "".join(
+                f"\n\t{line}" for line in (client.result(), "Press any key to return to the menu")
+            ))
+            context.idle.inkey("game_over")
+    finally:
+        sock.close()
+        if server is not None:
+            # The match ends with the host's session
+            server.stop()
+
+
+def test_match():
+    """Play a short match over a real socket and check both clients mirror the server."""
+    import tempfile
+
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "match.sock")
+        server = MatchServer(path, tick_rate=50, win_crystals=3)
+        thread = threading.Thread(target=server.serve, daemon=True)
+        thread.start()
+
+        clients = [connect(path), connect(path)]
+        received = [bytearray(), bytearray()]
+        mirrors = [Arena(size=MATCH_SIZE), Arena(size=MATCH_SIZE)]
+        last_tick = [0, 0]
+
+        def pump(timeout=0.05):
+            ready, _, _ = select.select(clients, [], [], timeout)
+            for i, sock in enumerate(clients):
+                if sock in ready:
+                    received[i] += sock.recv(65536)
+
+        def apply(i):
+            messages, used = read_messages(received[i])
+            del received[i][:used]
+            for message in messages:
+                if message[0] == b"H":
+                    assert message[1] == i
+                elif message[0] == b"T":
+                    last_tick[i] = message[1]
+                    for index, glyph in message[4]:
+                        mirrors[i].arena[index // MATCH_SIZE][(index % MATCH_SIZE) * 2] = GLYPHS[glyph]
+            return messages
+
+        # Player 1 heads for the crystal, player 2 wanders along the bottom
+        # and gives up once the crystal is gone
+        moves = [list("jjjjjlllll"), list("hhhhh")]
+        gave_up = False
+        deadline = time.monotonic() + 5
+        while thread.is_alive() and time.monotonic() < deadline:
+            pump()
+            for i, sock in enumerate(clients):
+                apply(i)
+                if moves[i] and server.scheduler is not None:
+                    sock.sendall(INPUT.pack(b"I", last_tick[i] + INPUT_DELAY, ord(moves[i].pop(0)), 0))
+            if not moves[1] and not gave_up and mirrors[1].arena[5][10] == "W":
+                clients[1].sendall(INPUT.pack(b"I", 0, ord("q"), 0))
+                gave_up = True
+
+        thread.join(timeout=5)
+        assert not thread.is_alive(), "Server didn't finish the match"
+        pump(0)
+        for i in range(2):
+            apply(i)
+            clients[i].close()
+
+        # Both clients ended up with exactly the server's arena
+        assert repr(mirrors[0]) == repr(server.match.arena)
+        assert repr(mirrors[1]) == repr(server.match.arena)
+        assert server.match.winner() == 0
+        assert server.match.scores() == (1, 0)
+        print(server.stats())
+
+    # Same inputs on the same ticks give the same match
+    def replay():
+        random.seed(2)
+        match = Match(size=MATCH_SIZE)
+        deltas = []
+        for tick in range(1, 60):
+            match.queue_input(tick % 2, tick, "jlkh"[tick % 4])
+            match.queue_input(1 - tick % 2, tick, "hjlk"[tick % 4])
+            deltas.append(encode_tick(match, match.status, sorted(match.step())))
+        return deltas
+
+    assert replay() == replay()
+    print("Match test passed.")
+
+
+def test_client_render():
+    """Check that drawing ticks in place leaves the same screen as a full frame."""
+    import io
+    import re
+    from blessed import Terminal
+
+    def screen(output):
+        # Just enough of a terminal for client frames: clear, newlines,
+        # cursor moves and clearing to the end of the line; colors are dropped
+        rows = {}
+        y = x = 0
+        for escape, params, command, char in re.findall(r"(\x1b(?:\[([0-9;]*)([A-Za-z])|\(B))|(.)", output, re.S):
+            if char == "\n":
+                y, x = y + 1, 0
+            elif char:
+                rows.setdefault(y, {})[x] = char
+                x += 1
+            elif command == "J":
+                rows = {}
+            elif command == "H":
+                y, x = (int(n) - 1 for n in params.split(";")) if params else (0, 0)
+            elif command == "K":
+                rows[y] = {column: c for column, c in rows.get(y, {}).items() if column < x}
+        return [
+            "".join(row.get(column, " ") for column in range(max(row, default=-1) + 1)).rstrip()
+            for _, row in sorted(rows.items())
+        ]
+
+    term = Terminal(kind="xterm-256color", stream=io.StringIO(), force_styling=True)
+    rng = random.Random(3)
+    random.seed(3)
+    client = _bench_client(term)
+    match = Match(size=MATCH_SIZE, win_crystals=255)
+    client._welcome(0, match.size, TICK_RATE, INPUT_DELAY, match.win_crystals)
+    _feed(client, encode_tick(match, PLAYING, match.all_positions()))
+    client.render()
+    frames = client.writer.frames_written
+
+    for tick in range(200):
+        if tick == 20:
+            # The idle prompt draws over the match and puts back a stale frame
+            last_frame = client.writer.last_frame
+            client.writer.write(compose("Still there?"))
+            client.writer.write(last_frame)
+            assert client.drawn_over()
+            client.render()
+        if match.status != PLAYING:
+            break
+        for player in (0, 1):
+            match.queue_input(player, match.tick + 1, _bot_command(match, player, rng))
+        changes = match.step()
+        if changes:
+            _feed(client, encode_tick(match, match.status, changes))
+            client.render()
+
+    # Only the idle prompt made the client compose whole frames again
+    assert client.writer.frames_written == frames + 3
+    drawn = screen(client.writer._stream.getvalue())
+    client.render(full=True)
+    assert drawn == screen(client.writer.last_frame), "\n".join(drawn)
+    client._sock.close()
+    print("Client render test passed.")
+
+
+def _bot_command(match, player, rng):
+    """A move for a benchmark player: usually towards the crystal, never into anything."""
+    wizard = match.wizards[player]
+    x, y = wizard.position
+    cells = match.arena.arena
+
+    safe = []
+    for command, (dx, dy) in MOVEMENTS.items():
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < match.size * 2 and 0 <= ny < match.size and cells[ny][nx] in (".", "♦"):
+            safe.append(command)
+    if rng.random() < 0.05 and wizard.can_open_portal():
+        command = rng.choice("0$")
+        target = 0 if command == "0" else (match.size - 1) * 2
+        if cells[y][target] == ".":
+            return command
+    if not safe:
+        return "h"
+
+    cx, cy = match.crystal.position
+    towards = [
+        command for command in safe
+        if abs(x + MOVEMENTS[command][0] - cx) + abs(y + MOVEMENTS[command][1] - cy) < abs(x - cx) + abs(y - cy)
+    ]
+    return rng.choice(towards if towards and rng.random() < 0.8 else safe)
+
+
+def _bench_client(term):
+    """A MatchClient drawing to a string, fed ticks by hand instead of a socket."""
+    import io
+    from types import SimpleNamespace
+    from output import FrameWriter
+
+    context = SimpleNamespace(term=term, writer=FrameWriter(io.StringIO()), idle=None)
+    sock, other = socket.socketpair()
+    other.close()
+    return MatchClient(context, sock)
+
+
+def _feed(client, message):
+    for tick in read_messages(message)[0]:
+        client._apply_tick(*tick[1:])
+
+
+def test_match_bandwidth(sizes=(10, 20, 40, 80), ticks=3000):
+    """
+    Measure tick processing time and bandwidth per player at a range of
+    arena sizes: the deltas on the socket, what the client writes to the
+    player's terminal, and what redrawing the whole frame every tick would.
+    """
+    import io
+    from blessed import Terminal
+
+    term = Terminal(kind="xterm-256color", stream=io.StringIO(), force_styling=True)
+    rng = random.Random(5)
+    print(f"{'size':>5} {'matches':>8} {'ms/tick':>8} {'max ms':>8} {'delta B/tick':>13} "
+          f"{'delta B/s':>10} {'term B/s':>10} {'redraw B/s':>11} {'keyframe B':>11}")
+
+    def new_match(size):
+        match = Match(size=size, win_crystals=255)
+        # Start with tails as long as the arena is wide, so bigger arenas
+        # also mean more tail to draw each move
+        for wizard in match.wizards:
+            wizard._crystals = size
+            wizard._add_segment(wizard.position)
+        # A joining client gets the whole arena
+        client._welcome(0, size, TICK_RATE, INPUT_DELAY, match.win_crystals)
+        _feed(client, encode_tick(match, PLAYING, match.all_positions()))
+        client.render()
+        return match
+
+    for size in sizes:
+        random.seed(size)
+        client = _bench_client(term)
+        match = new_match(size)
+        matches = 1
+        step_times = []
+        delta_bytes = 0
+        redraw_bytes = 0
+        redraws = 0
+
+        for _ in range(ticks):
+            if match.status != PLAYING:
+                match = new_match(size)
+                matches += 1
+            for player in (0, 1):
+                match.queue_input(player, match.tick + 1, _bot_command(match, player, rng))
+
+            start = time.perf_counter()
+            changes = match.step()
+            message = encode_tick(match, match.status, changes) if changes else b""
+            step_times.append(time.perf_counter() - start)
+            delta_bytes += len(message)
+
+            if message:
+                _feed(client, message)
+                client.render()
+            # What the client would write redrawing the whole frame instead
+            if match.tick % 50 == 0:
+                redraw_bytes += len(compose(client.renderer.render(client.arena)).encode())
+                redraws += 1
+
+        client._sock.close()
+        keyframe = len(encode_tick(match, match.status, match.all_positions()))
+        mean_ms = sum(step_times) / len(step_times) * 1000
+        max_ms = max(step_times) * 1000
+        per_tick = delta_bytes / ticks
+        term_rate = client.writer.bytes_written / ticks * TICK_RATE
+        redraw_rate = redraw_bytes / redraws * TICK_RATE
+        print(f"{size:>5} {matches:>8} {mean_ms:>8.3f} {max_ms:>8.3f} {per_tick:>13.1f} "
+              f"{per_tick * TICK_RATE:>10.0f} {term_rate:>10.0f} {redraw_rate:>11.0f} {keyframe:>11}")
+        assert mean_ms < 1000 / TICK_RATE, "Ticks take longer than the tick length"
+        assert term_rate < redraw_rate, "Drawing changed cells costs more than redrawing"
+
+
+def main(argv=None):
+    """Command line for hosting matches and measuring them."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="VimWizards head-to-head matches")
+    commands = parser.add_subparsers(dest="command")
+
+    serve_parser = commands.add_parser("serve", help="Host matches back to back on the match socket")
+    serve_parser.add_argument("--socket", default=SOCKET_PATH)
+    serve_parser.add_argument("--size", type=int, default=MATCH_SIZE)
+    commands.add_parser("test", help="Run the match self test")
+    commands.add_parser("bench", help="Measure tick time and bandwidth at several arena sizes")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        while True:
+            server = MatchServer(args.socket, size=args.size)
+            print(f"Waiting for players on {args.socket}")
+            server.serve()
+            print(server.stats())
+    elif args.command == "bench":
+        test_match_bandwidth()
+    else:
+        test_match()
+        test_client_render()
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Frame output for VimWizards.
+Each frame is written to the terminal in a single write() so it goes out as
+one SSH packet instead of a dozen. When the client can't keep up, frames
+that would only be overwritten by a newer one are dropped.
+"""
+
+import os
+import sys
+import time
+
+try:
+    import fcntl
+    import struct
+    import termios
+    TIOCOUTQ = termios.TIOCOUTQ
+except (ImportError, AttributeError):
+    TIOCOUTQ = None
+
+# Escape sequence that clears the screen and scrollback and homes the cursor
+CLEAR_SCREEN = '\033[2J\033[3J\033[H'
+
+# A write taking longer than this means the link is backed up (seconds)
+SLOW_WRITE = 0.05
+# More unsent output than this in the tty queue means the link is backed up (bytes)
+MAX_BACKLOG = 4096
+# How long to wait before retrying a held back frame (seconds)
+RETRY_DELAY = 0.02
+
+
+def compose(*lines):
+    """Build a full-screen frame from lines, the same as clearing and printing each."""
+    return CLEAR_SCREEN + "\n" + "".join(f"{line}\n" for line in lines)
+
+
+class FrameWriter:
+    """Writes whole frames with one syscall and skips stale ones on slow links."""
+
+    def __init__(self, stream=None, clock=time.monotonic):
+        self._stream = stream if stream is not None else sys.stdout
+        self._clock = clock
+        self._pending = None
+        self._ready_at = 0.0
+        # Latest frame submitted, so a screen can be put back after an overlay
+        self.last_frame = None
+        self._started = clock()
+
+        self.bytes_written = 0
+        self.frames_written = 0
+        self.dropped_frames = 0
+
+        try:
+            self._fd = self._stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            self._fd = None
+
+    @property
+    def pending(self):
+        return self._pending is not None
+
+    def backlog(self):
+        """Bytes written to the terminal that haven't been sent yet, if the OS can tell us."""
+        if TIOCOUTQ is None or self._fd is None:
+            return 0
+        try:
+            buf = fcntl.ioctl(self._fd, TIOCOUTQ, struct.pack("i", 0))
+            return struct.unpack("i", buf)[0]
+        except OSError:
+            return 0
+
+    def congested(self):
+        return self._clock() < self._ready_at or self.backlog() > MAX_BACKLOG
+
+    def submit(self, frame):
+        """
+        Queue a frame and send it unless the link is backed up.
+
+        Returns:
+            True if the frame was written, False if it is being held back
+        """
+        if self._pending is not None:
+            # The held back frame will never be seen now
+            self.dropped_frames += 1
+        self._pending = frame
+        self.last_frame = frame
+
+        if self.congested():
+            return False
+
+        self.flush()
+        return True
+
+    def write(self, frame):
+        """Write a frame now, for screens that only redraw on a keypress."""
+        self.submit(frame)
+        self.flush()
+
+    def flush(self):
+        """Write the latest queued frame, if any, regardless of congestion."""
+        if self._pending is None:
+            return
+
+        data = self._pending.encode("utf-8")
+        self._pending = None
+        self._send(data)
+        self.frames_written += 1
+
+    def update(self, data):
+        """
+        Write a partial update over the frame on screen, e.g. a few cells
+        drawn with cursor movement. Unlike frames, updates can't be dropped,
+        so nothing is written while the link is backed up or a frame is
+        held back; the caller keeps its changes until this returns True.
+        """
+        if self._pending is not None or self.congested():
+            return False
+        self._send(data.encode("utf-8"))
+        return True
+
+    def retry(self):
+        """Send a held back frame once the link has caught up."""
+        if self._pending is not None and not self.congested():
+            self.flush()
+
+    def retry_after(self):
+        """Seconds until a held back frame should be retried, or None if nothing is waiting."""
+        if self._pending is None:
+            return None
+        return max(RETRY_DELAY, self._ready_at - self._clock())
+
+    def bytes_per_second(self):
+        elapsed = self._clock() - self._started
+        return self.bytes_written / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            "bytes_written": self.bytes_written,
+            "bytes_per_second": self.bytes_per_second(),
+            "frames_written": self.frames_written,
+            "dropped_frames": self.dropped_frames,
+        }
+
+    def _send(self, data):
+        start = self._clock()
+        self._write(data)
+        finished = self._clock()
+
+        # Give a slow link as long again to drain before the next frame
+        elapsed = finished - start
+        self._ready_at = finished + elapsed if elapsed > SLOW_WRITE else 0.0
+
+        self.bytes_written += len(data)
+
+    def _write(self, data):
+        if self._fd is None:
+            self._stream.write(data.decode("utf-8"))
+            self._stream.flush()
+            return
+
+        # Anything already printed must go out before the frame
+        self._stream.flush()
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+
+
+def test_frame_writer():
+    """Test single writes and frame dropping with a fake clock."""
+    import io
+
+    now = [0.0]
+    stream = io.StringIO()
+    writer = FrameWriter(stream, clock=lambda: now[0])
+
+    assert writer.submit(compose("Score: 0", "arena"))
+    assert stream.getvalue() == CLEAR_SCREEN + "\nScore: 0\narena\n"
+
+    # Pretend the link is slow: intermediate frames are replaced by the latest
+    writer._ready_at = 1.0
+    assert not writer.submit(compose("frame 1"))
+    assert not writer.submit(compose("frame 2"))
+    assert writer.retry_after() == 1.0
+    now[0] = 1.0
+    assert writer.submit(compose("frame 3"))
+    assert stream.getvalue().endswith("frame 3\n")
+    assert "frame 1" not in stream.getvalue()
+
+    # Updates wait for the link instead of being dropped
+    writer._ready_at = 2.0
+    assert not writer.update("\033[5;6Hx")
+    now[0] = 2.0
+    assert writer.update("\033[5;6Hx")
+    assert stream.getvalue().endswith("frame 3\n\033[5;6Hx")
+    assert writer.last_frame == compose("frame 3")
+
+    stats = writer.stats()
+    assert stats["frames_written"] == 2
+    assert stats["dropped_frames"] == 2
+    print(stats)
+    print("Frame writer test passed.")
+
+
+if __name__ == "__main__":
+    test_frame_writer()
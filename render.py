@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Colored arena rendering for VimWizards.
+Escape sequences are looked up once per glyph and only written when the
+style changes between neighbouring cells, so a colored frame stays close to
+the size of the plain one.
+"""
+
+# Foreground color per glyph: 256 color palette, then the basic 8 colors
+PALETTES = {
+    256: {
+        "W": 201,  # Wizard - magenta
+        "o": 45,   # Tail - cyan
+        "@": 99,   # Portal - purple
+        "♦": 226,  # Crystal - yellow
+        "M": 46,   # Second wizard in head-to-head - green
+        "x": 34,   # Second wizard's tail - dark green
+    },
+    8: {
+        "W": 5,
+        "o": 6,
+        "@": 4,
+        "♦": 3,
+        "M": 2,
+        "x": 2,
+    },
+}
+
+# Blank columns between cells don't show a foreground color, so they never
+# force a style change
+TRANSPARENT = " "
+
+
+class ArenaRenderer:
+    """Renders arena rows with color, degrading to plain text on monochrome terminals."""
+
+    def __init__(self, term, colors=None):
+        if colors is None:
+            colors = term.number_of_colors if term.does_styling else 0
+
+        self._normal = term.normal if colors else ""
+
+        # Precomputed glyph -> SGR escape cache
+        self._styles = {}
+        for depth in sorted(PALETTES, reverse=True):
+            if colors >= depth:
+                self._styles = {
+                    glyph: str(term.color(color))
+                    for glyph, color in PALETTES[depth].items()
+                }
+                break
+
+    @property
+    def colored(self):
+        return bool(self._styles)
+
+    def render_row(self, row):
+        """Join a row of cells, switching style only where it changes."""
+        if not self._styles:
+            return "".join(row)
+
+        out = []
+        current = None
+        for cell in row:
+            if cell != TRANSPARENT:
+                style = self._styles.get(cell)
+                if style != current:
+                    # Styles only set the foreground color, so one color can
+                    # replace another without resetting in between
+                    out.append(self._normal if style is None else style)
+                    current = style
+            out.append(cell)
+
+        # Never let a color leak into the border
+        if current is not None:
+            out.append(self._normal)
+
+        return "".join(out)
+
+    def render_cell(self, cell):
+        """A single cell, styled on its own to be drawn in place over a frame."""
+        style = self._styles.get(cell)
+        if style is None:
+            return cell
+        return style + cell + self._normal
+
+    def render(self, arena):
+        return arena.render(self.render_row)
+
+
+def test_renderer():
+    """Compare frame sizes for plain, naive per-cell and minimal SGR rendering."""
+    import io
+    import re
+    from blessed import Terminal
+    from game import Arena, Crystal, Wizard
+
+    term = Terminal(kind="xterm-256color", stream=io.StringIO(), force_styling=True)
+
+    arena = Arena(size=10)
+    wizard = Wizard(0, 0, arena)
+    crystal = Crystal(8, 6, arena)
+    wizard._crystals = 12
+    wizard._add_segment(wizard.position)
+    for step in [(2, 0)] * 9 + [(0, 1)] * 4:
+        x, y = wizard.position
+        wizard.position = (x + step[0], y + step[1])
+    wizard.create_portal((18, 4), (0, 4), crystal)
+
+    plain = repr(arena)
+
+    def naive_row(row):
+        return "".join(
+            f"{term.color(PALETTES[256][cell])}{cell}{term.normal}" if cell in PALETTES[256]
+            else cell
+            for cell in row
+        )
+
+    naive = arena.render(naive_row)
+    minimal = ArenaRenderer(term, colors=256).render(arena)
+    basic = ArenaRenderer(term, colors=8).render(arena)
+    mono = ArenaRenderer(term, colors=0).render(arena)
+
+    sizes = {
+        "plain": len(plain.encode()),
+        "naive": len(naive.encode()),
+        "minimal": len(minimal.encode()),
+        "8 color": len(basic.encode()),
+        "monochrome": len(mono.encode()),
+    }
+    for name, size in sizes.items():
+        print(f"{name:<12} {size:>6} bytes")
+
+    assert mono == plain
+    assert re.sub(r"\x1b(\[[0-9;]*m|\(B)", "", minimal) == plain
+    assert sizes["minimal"] < sizes["naive"]
+    # A tail run of 12 segments should cost one escape pair, not twelve
+    assert sizes["minimal"] - sizes["plain"] < (sizes["naive"] - sizes["plain"]) / 2
+    print("Renderer test passed.")
+
+
+if __name__ == "__main__":
+    test_renderer()
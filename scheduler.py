@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Tick scheduler for VimWizards real-time mode.
+Game events (crystal expiry, portal decay, timed moves) are queued on a heap
+keyed by the tick they are due on, so the game loop can sleep until the next
+event instead of polling.
+"""
+
+import heapq
+import itertools
+import time
+
+
+class ScheduledEvent:
+    """A callback queued to run on a given tick."""
+
+    __slots__ = ("due", "callback", "interval", "cancelled")
+
+    def __init__(self, due, callback, interval=None):
+        self.due = due
+        self.callback = callback
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        """Stop the event from firing (and from repeating)."""
+        self.cancelled = True
+
+
+class Scheduler:
+    """Heap based scheduler that counts time in fixed-length ticks."""
+
+    def __init__(self, tick_rate=10, max_catchup_ticks=5, clock=time.monotonic):
+        self._tick_rate = tick_rate
+        self._tick_length = 1.0 / tick_rate
+        self._max_catchup_ticks = max_catchup_ticks
+        self._clock = clock
+        self._heap = []
+        # Sequence numbers keep ordering stable for events due on the same tick
+        self._sequence = itertools.count()
+        self._tick = 0
+        self._start = clock()
+        self._dropped_ticks = 0
+
+    @property
+    def tick(self):
+        """The last tick that has been processed."""
+        return self._tick
+
+    @property
+    def tick_length(self):
+        return self._tick_length
+
+    @property
+    def dropped_ticks(self):
+        """Ticks skipped because the loop fell too far behind the clock."""
+        return self._dropped_ticks
+
+    def schedule(self, delay, callback, interval=None):
+        """
+        Run callback after delay ticks.
+
+        Args:
+            delay: Number of ticks from the current tick (minimum 1)
+            callback: Called with no arguments when the event is due
+            interval: If given, the event repeats every interval ticks
+
+        Returns:
+            The ScheduledEvent, which can be cancelled
+        """
+        event = ScheduledEvent(self._tick + max(1, delay), callback, interval)
+        heapq.heappush(self._heap, (event.due, next(self._sequence), event))
+        return event
+
+    def pending(self):
+        """Number of events still waiting to fire (including cancelled ones)."""
+        return len(self._heap)
+
+    def clock_tick(self):
+        """The tick the wall clock says we should be on."""
+        return int((self._clock() - self._start) / self._tick_length)
+
+    def time_until_next_event(self):
+        """
+        Seconds until the next event is due, or None if nothing is scheduled.
+        Cancelled events at the head of the heap are discarded here so an
+        idle game can block on input without waking up.
+        """
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            return None
+
+        due_at = self._start + self._heap[0][0] * self._tick_length
+        return max(0.0, due_at - self._clock())
+
+    def advance(self, to_tick=None):
+        """
+        Process every event due up to and including to_tick.
+
+        When the loop is more than max_catchup_ticks behind the clock, the
+        extra ticks are dropped by shifting the start time forward, so a
+        stalled session resumes at normal speed instead of fast-forwarding.
+
+        Returns:
+            Number of events that fired
+        """
+        if to_tick is None:
+            to_tick = self.clock_tick()
+
+        behind = to_tick - self._tick
+        if behind > self._max_catchup_ticks:
+            dropped = behind - self._max_catchup_ticks
+            self._start += dropped * self._tick_length
+            self._dropped_ticks += dropped
+            # Events that were due during the dropped ticks are still at or
+            # before to_tick, so they keep their relative order and fire now
+            to_tick -= dropped
+
+        fired = 0
+        while self._heap and self._heap[0][0] <= to_tick:
+            due, _, event = heapq.heappop(self._heap)
+            if event.cancelled:
+                continue
+
+            # Run the callback as if we were on its tick so rescheduling is
+            # relative to when it was due, not when we got around to it
+            self._tick = max(self._tick, due)
+            event.callback()
+            fired += 1
+
+            if event.interval and not event.cancelled:
+                event.due = self._tick + event.interval
+                heapq.heappush(self._heap, (event.due, next(self._sequence), event))
+
+        self._tick = max(self._tick, to_tick)
+        return fired
+
+    def clear(self):
+        """Drop all scheduled events."""
+        self._heap = []
+
+
+def test_scheduler():
+    """Test the scheduler with a fake clock."""
+    now = [0.0]
+    scheduler = Scheduler(tick_rate=10, clock=lambda: now[0])
+    fired = []
+
+    scheduler.schedule(3, lambda: fired.append("once"))
+    repeating = scheduler.schedule(2, lambda: fired.append("repeat"), interval=2)
+    cancelled = scheduler.schedule(1, lambda: fired.append("cancelled"))
+    cancelled.cancel()
+
+    assert scheduler.time_until_next_event() == 0.2
+    scheduler.advance(4)
+    assert fired == ["repeat", "once", "repeat"], fired
+
+    repeating.cancel()
+    assert scheduler.time_until_next_event() is None
+
+    # Falling far behind drops ticks instead of replaying them all
+    now[0] = 10.0
+    scheduler.schedule(1, lambda: fired.append("late"))
+    scheduler.advance()
+    assert fired[-1] == "late"
+    assert scheduler.dropped_ticks > 0
+
+    # After a stall, repeating events carry on at their normal interval
+    now[0] = 0.5
+    scheduler = Scheduler(tick_rate=10, clock=lambda: now[0])
+    ticks = []
+    scheduler.schedule(1, lambda: ticks.append(scheduler.tick), interval=1)
+    scheduler.advance()
+    now[0] = 10.0
+    scheduler.advance()
+    assert scheduler.tick == scheduler.clock_tick(), (scheduler.tick, scheduler.clock_tick())
+    assert scheduler.time_until_next_event() <= scheduler.tick_length + 1e-9
+    fired_before = len(ticks)
+    for i in range(1, 11):
+        # Halfway through each tick, clear of float rounding at tick edges
+        now[0] = 10.05 + i * 0.1
+        scheduler.advance()
+    assert len(ticks) - fired_before == 10, ticks
+    print("Scheduler test passed.")
+
+
+if __name__ == "__main__":
+    test_scheduler()
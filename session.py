@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Game session for VimWizards.
+Holds the state of a single run (arena, wizard, crystal and the Vim command
+buffers) and drives it either turn-by-turn or in real-time mode.
+"""
+
+from game import Arena, Crystal, Wizard
+from output import compose
+from render import ArenaRenderer
+from scheduler import Scheduler
+
+# Movement vectors as tuples
+MOVEMENTS = {
+    'h': (-2, 0),  # Left
+    'l': (2, 0),  # Right
+    'k': (0, -1),  # Up
+    'j': (0, 1)  # Down
+}
+
+# Real-time mode settings, in ticks
+TICK_RATE = 10
+CRYSTAL_LIFETIME = 80
+PORTAL_LIFETIME = 60
+SPEED_MOVE_INTERVAL = 4
+
+
+class GameSession:
+    """A single game from the first frame until the wizard wins, loses or quits."""
+
+    def __init__(self, context, size=10, mode="classic"):
+        self.term = context.term
+        self.writer = context.writer
+        self.idle = context.idle
+        self.arena = Arena(size=size)
+        self.wizard = Wizard(0, 0, self.arena)
+        self.crystal = Crystal(4, 4, self.arena)
+        self.renderer = ArenaRenderer(self.term)
+
+        # Number buffer for #G command
+        self.number_buffer = ""
+        # Command mode buffer
+        self.command_buffer = ""
+        self.command_mode = False
+
+        self.mode = mode
+        self.running = True
+        self.game_lost = False
+
+        # Moves made, and an optional snapshot.Autosave to tell about them
+        self.moves = 0
+        self.autosave = None
+        # Set while a key or tick is changing the game state, when a
+        # snapshot could catch the tail or portal counts half updated
+        self.updating = False
+        # Set by a SIGHUP that arrived while updating
+        self.hung_up = False
+
+        # Real-time mode state
+        self.realtime = False
+        self.scheduler = None
+        self._direction = None
+        self._crystal_expiry = None
+        # Open portal pair -> its decay event
+        self._portal_decays = {}
+        self._crystals_seen = 0
+
+    def render(self):
+        """Draw the current frame."""
+        lines = [
+            # Show Crystals collected as score
+            f"Score: {self.wizard.crystals}",
+            # f"Available: {self.arena._rendered_objects_percentage}%\n", # For debugging purposes
+
+            # Show the arena
+            self.renderer.render(self.arena),
+
+            # Display instructions
+            "Press 'h/j/k/l' to move left/down/up/right",
+            "Press '0/$' to teleport leftmost/rightmost",
+            "Press '#G' to teleport to row # (e.g., 5G for row 5)",
+            "Press ':q!' to quit",
+        ]
+        if self.number_buffer:
+            lines.append(f"Number buffer: {self.number_buffer}")
+        if self.command_mode:
+            lines.append(f":{self.command_buffer}")
+
+        # One write per frame; on a slow link it may be held back and
+        # replaced by a newer one
+        self.writer.submit(compose(*lines))
+
+    def lose(self):
+        self.game_lost = True
+        self.running = False
+
+    def move(self, dx, dy):
+        """Step the wizard by a movement vector, respecting walls and the tail."""
+        current_x, current_y = self.wizard.position
+        new_x = current_x + dx
+        new_y = current_y + dy
+
+        # Check boundaries
+        if not (0 <= new_x <= (self.arena._size - 1) * 2 and
+                0 <= new_y <= self.arena._size - 1):
+            return
+
+        # Check if trying to move into the immediate tail segment
+        if self.wizard._tail and (new_x, new_y) == self.wizard._tail[0]:
+            return  # Don't allow this move
+
+        self.wizard.position = (new_x, new_y)
+        self.moves += 1
+
+        # Check for tail collision
+        if self.wizard.collision_with_tail():
+            self.lose()
+
+    def teleport(self, new_pos):
+        """Open a portal from the wizard's position to new_pos and step through it."""
+        if not self.wizard.can_open_portal():
+            return
+
+        old_pos = self.wizard.position
+
+        # Only teleport if not moving to same position
+        if old_pos == new_pos:
+            return
+
+        self.wizard.create_portal(old_pos, new_pos, self.crystal)
+        self.wizard.position = new_pos
+        self.moves += 1
+
+        # Check for tail collision
+        if self.wizard.collision_with_tail():
+            self.lose()
+
+    def handle_key(self, key):
+        """Apply a single keypress to the game state."""
+        term = self.term
+
+        # Handle command mode
+        if key == ':' and not self.command_mode:
+            self.command_mode = True
+            self.command_buffer = ""
+        elif self.command_mode:
+            if key.code == term.KEY_ENTER or key == '\r' or key == '\n':
+                # Execute command
+                if self.command_buffer == "q!":
+                    self.running = False
+                # Clear command mode
+                self.command_mode = False
+                self.command_buffer = ""
+            elif key.code == term.KEY_ESCAPE or key == '\x1b':
+                # Exit command mode
+                self.command_mode = False
+                self.command_buffer = ""
+            elif key.code == term.KEY_BACKSPACE or key == '\x7f' or key == '\b':
+                # Handle backspace
+                if self.command_buffer:
+                    self.command_buffer = self.command_buffer[:-1]
+            elif key and not key.is_sequence:
+                # Add character to command buffer
+                self.command_buffer += str(key)
+
+        # Skip all game controls if in command mode
+        elif not self.command_mode:
+            # Movement Handling
+            if key.lower() in MOVEMENTS:
+                self._direction = MOVEMENTS[key.lower()]
+                self.move(*self._direction)
+
+            elif key == '0' and not self.number_buffer:  # Go to start of current row only if buffer is empty
+                _, current_y = self.wizard.position
+                self.teleport((0, current_y))
+
+            elif key == '$':  # Go to end of current row
+                _, current_y = self.wizard.position
+                self.number_buffer = ""  # Clear buffer
+                self.teleport(((self.arena._size - 1) * 2, current_y))
+
+            # collision detection
+            if self.wizard.collision(self.crystal):
+                # call the crystal re-render method
+                self.wizard.collect_crystals(self.crystal)
+
+            # Handle number input (0-9)
+            elif key.isdigit() and (key != '0' or self.number_buffer):  # Allow 0 if buffer has content
+                self.number_buffer += key
+
+            # Handle G command for row teleportation
+            elif key == 'G' and self.number_buffer:
+                target_row = int(self.number_buffer) - 1  # Adjusted for zero index
+                current_x, _ = self.wizard.position
+
+                # Check if target row is valid
+                if 0 <= target_row <= self.arena._size - 1:
+                    self.teleport((current_x, target_row))
+
+                self.number_buffer = ""  # Clearing buffer after use of G command
+
+            # Clear buffer on other keys
+            elif key and not key.isdigit():
+                self.number_buffer = ""
+
+        # Check if portal should close (after all movements)
+        self.wizard.check_portal_clear()
+
+        if self.realtime:
+            self._sync_timers()
+
+        if self.autosave:
+            self.autosave.moved(self)
+
+    def _update(self, callback, *args):
+        """Run a game state change, then save and exit if the connection dropped meanwhile."""
+        self.updating = True
+        try:
+            return callback(*args)
+        finally:
+            self.updating = False
+            if self.hung_up:
+                if self.autosave:
+                    self.autosave.save(self)
+                raise SystemExit(0)
+
+    def play(self):
+        """Run the loop for this session's game mode."""
+        if self.mode == "classic":
+            self.run()
+        else:
+            self.run_realtime(speed=self.mode == "speed")
+
+    def run(self):
+        """Turn-based loop: the game only advances when a key is pressed."""
+        dirty = True
+        while self.running:
+            if dirty:
+                self.render()
+                dirty = False
+
+            # Wait for input, waking up early if a frame is being held back
+            key = self.idle.inkey("game", timeout=self.writer.retry_after())
+            if key:
+                self._update(self.handle_key, key)
+                dirty = True
+            else:
+                self.writer.retry()
+
+    # Real-time mode
+
+    def _expire_crystal(self):
+        # The crystal got bored of waiting and moved somewhere else
+        self.crystal.relocate(self.wizard)
+        self._crystal_expiry = self.scheduler.schedule(CRYSTAL_LIFETIME, self._expire_crystal)
+
+    def _decay_portal(self, pair):
+        del self._portal_decays[pair]
+        self.wizard.close_portal(pair)
+
+    def _speed_move(self):
+        # Keep walking in the last direction, snake style
+        if not self.running or not self._direction or self.command_mode:
+            return
+
+        self.move(*self._direction)
+        if self.running and self.wizard.collision(self.crystal):
+            self.wizard.collect_crystals(self.crystal)
+        self.wizard.check_portal_clear()
+        self._sync_timers()
+
+        if self.autosave:
+            self.autosave.moved(self)
+
+    def _sync_timers(self):
+        """Start or stop timed events after the game state changed."""
+        # A fresh crystal gets a fresh lifetime
+        if self.wizard.crystals != self._crystals_seen:
+            self._crystals_seen = self.wizard.crystals
+            if self._crystal_expiry:
+                self._crystal_expiry.cancel()
+            self._crystal_expiry = self.scheduler.schedule(CRYSTAL_LIFETIME, self._expire_crystal)
+
+        # Each portal pair decays if the tail takes too long to drain through it
+        pairs = list(self.wizard.portals)
+        for pair in pairs:
+            if pair not in self._portal_decays:
+                self._portal_decays[pair] = self.scheduler.schedule(
+                    PORTAL_LIFETIME, lambda pair=pair: self._decay_portal(pair))
+        if len(self._portal_decays) > len(pairs):
+            for pair in [pair for pair in self._portal_decays if pair not in pairs]:
+                self._portal_decays.pop(pair).cancel()
+
+    def run_realtime(self, speed=False, tick_rate=TICK_RATE):
+        """
+        Fixed-timestep loop: timed events fire on ticks whether or not a key
+        is pressed. Input is polled with a timeout that ends at the next due
+        event, so an idle game sleeps in select() rather than spinning, and
+        the frame is only redrawn after something changed. When several
+        ticks are processed at once the intermediate frames are skipped,
+        and the frame writer drops frames a slow client can't keep up with.
+        """
+        self.realtime = True
+        self.scheduler = Scheduler(tick_rate=tick_rate)
+        self._crystal_expiry = self.scheduler.schedule(CRYSTAL_LIFETIME, self._expire_crystal)
+        if speed:
+            self.scheduler.schedule(SPEED_MOVE_INTERVAL, self._speed_move, interval=SPEED_MOVE_INTERVAL)
+
+        dirty = True
+        while self.running:
+            if dirty:
+                self.render()
+                dirty = False
+
+            timeouts = [
+                timeout for timeout in
+                (self.scheduler.time_until_next_event(), self.writer.retry_after())
+                if timeout is not None
+            ]
+            key = self.idle.inkey("game", timeout=min(timeouts) if timeouts else None)
+            if key:
+                self._update(self.handle_key, key)
+                dirty = True
+
+            if self.running and self._update(self.scheduler.advance):
+                dirty = True
+
+            if not dirty:
+                self.writer.retry()
+
+        self.scheduler.clear()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Save and resume for VimWizards.
+An in-progress game is packed into a small versioned binary snapshot and
+written atomically, so a dropped SSH connection doesn't lose the run.
+
+Layout (little-endian):
+    header   magic, version, arena size, game mode
+    state    wizard position and crystals, crystal position, tail length,
+             portal pair count, tail segments not behind any pair
+    portals  entry, exit and tail segments behind it, per pair, oldest first
+    tail     one (x, y) byte pair per segment
+    arena    one byte per cell, even columns only, as it looks under the portals
+    rng      Mersenne Twister state from random.getstate()
+"""
+
+import os
+import random
+import re
+import signal
+import struct
+import tempfile
+from contextlib import contextmanager
+
+from session import GameSession
+
+MAGIC = b"VWIZ"
+VERSION = 2
+SAVE_DIR = "./data/saves"
+# GameSession puts the crystal at (4, 4) before the saved state is applied
+MIN_SIZE = 5
+
+# Moves between automatic saves, 1 saves on every move
+SAVE_EVERY = 5
+
+HEADER = struct.Struct("<4sBBB")
+STATE = struct.Struct("<BBHBBHBH")
+PORTAL = struct.Struct("<BBBBH")
+RNG_STATE = struct.Struct("<B625IBd")
+
+MODES = ["classic", "realtime", "speed"]
+GLYPHS = [".", "W", "o", "@", "♦"]
+GLYPH_CODES = {glyph: code for code, glyph in enumerate(GLYPHS)}
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot can't be read."""
+
+
+def client_name() -> str:
+    """The current player's client, made safe for a file name."""
+    # Everyone plays over the same SSH account, so players are told apart
+    # by the address they connect from
+    client = os.environ.get("SSH_CLIENT", "").split(" ")[0]
+    if not client:
+        client = os.environ.get("USER", "local")
+    return re.sub(r"[^A-Za-z0-9]", "_", client)
+
+
+def save_path(save_dir: str = SAVE_DIR, pid=None) -> str:
+    """
+    Where this session's snapshot lives. Each session has its own, so two
+    sessions from the same client don't overwrite or discard each other's.
+    """
+    if pid is None:
+        pid = os.getpid()
+    return os.path.join(save_dir, f"{client_name()}-{pid}.snap")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Someone else's process
+        return True
+    return True
+
+
+def resumable_saves(save_dir: str = SAVE_DIR) -> list:
+    """Saves from this client whose session has ended, newest first."""
+    client = client_name()
+    pattern = re.compile(re.escape(client) + r"-(\d+)\.snap")
+    saves = []
+    try:
+        names = os.listdir(save_dir)
+    except OSError:
+        return []
+
+    for name in names:
+        match = pattern.fullmatch(name)
+        if not match or _pid_alive(int(match.group(1))):
+            continue
+        path = os.path.join(save_dir, name)
+        try:
+            saves.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+
+    return [path for _, path in sorted(saves, reverse=True)]
+
+
+def resume(context, path: str, save_dir: str = SAVE_DIR):
+    """
+    Take over the newest readable save left by an ended session, moving it
+    to this session's path so no other session can resume it too.
+
+    Returns:
+        The GameSession, or None if there is nothing to resume
+    """
+    for orphan in resumable_saves(save_dir):
+        try:
+            os.replace(orphan, path)
+        except OSError:
+            # Another session got there first
+            continue
+        session = load_file(context, path)
+        if session is not None:
+            return session
+        discard(path)
+    return None
+
+
+def dump(session: GameSession) -> bytes:
+    """Pack a game session into a snapshot."""
+    arena = session.arena
+    wizard = session.wizard
+    portals = wizard.portals
+
+    cells = bytearray(GLYPH_CODES[row[c]] for row in arena.arena for c in range(0, len(row), 2))
+    for (x, y), beneath in arena.portal_cells():
+        cells[y * arena._size + x // 2] = GLYPH_CODES[beneath]
+
+    parts = [
+        HEADER.pack(MAGIC, VERSION, arena._size, MODES.index(session.mode)),
+        STATE.pack(
+            wizard._x, wizard._y, wizard._crystals,
+            session.crystal._x, session.crystal._y,
+            len(wizard._tail), len(portals), portals.unassigned,
+        ),
+    ]
+    parts.extend(
+        PORTAL.pack(pair.entry[0], pair.entry[1], pair.exit[0], pair.exit[1], pair.segments)
+        for pair in portals
+    )
+    parts.append(bytes(coordinate for segment in wizard._tail for coordinate in segment))
+    parts.append(bytes(cells))
+
+    rng_version, mt_state, gauss_next = random.getstate()
+    parts.append(RNG_STATE.pack(
+        rng_version, *mt_state,
+        gauss_next is not None, gauss_next if gauss_next is not None else 0.0,
+    ))
+
+    return b"".join(parts)
+
+
+def load(context, data: bytes) -> GameSession:
+    """
+    Rebuild a game session from a snapshot.
+
+    Raises:
+        SnapshotError: If the data isn't a snapshot this version can read
+    """
+    try:
+        magic, version, size, mode = HEADER.unpack_from(data)
+    except struct.error as e:
+        raise SnapshotError(f"Truncated snapshot: {e}")
+
+    if magic != MAGIC:
+        raise SnapshotError("Not a VimWizards snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+
+    try:
+        (wx, wy, crystals, crystal_x, crystal_y,
+         tail_length, portal_count, unassigned) = STATE.unpack_from(data, HEADER.size)
+
+        offset = HEADER.size + STATE.size
+        pairs = []
+        for _ in range(portal_count):
+            pairs.append(PORTAL.unpack_from(data, offset))
+            offset += PORTAL.size
+        tail_bytes = data[offset:offset + tail_length * 2]
+        offset += tail_length * 2
+        cells = data[offset:offset + size * size]
+        offset += size * size
+        rng = RNG_STATE.unpack_from(data, offset)
+    except struct.error as e:
+        raise SnapshotError(f"Truncated snapshot: {e}")
+
+    if len(tail_bytes) != tail_length * 2 or len(cells) != size * size:
+        raise SnapshotError("Truncated snapshot")
+
+    # A damaged file shouldn't be able to index past the arena or the tables
+    if size < MIN_SIZE:
+        raise SnapshotError(f"Arena size {size} is too small")
+    if mode >= len(MODES):
+        raise SnapshotError(f"Unknown game mode {mode}")
+    if max(cells) >= len(GLYPHS):
+        raise SnapshotError("Unknown glyph in arena")
+
+    def on_arena(x, y):
+        return x % 2 == 0 and 0 <= x <= (size - 1) * 2 and 0 <= y < size
+
+    positions = [(wx, wy), (crystal_x, crystal_y)]
+    positions.extend(zip(tail_bytes[0::2], tail_bytes[1::2]))
+    for entry_x, entry_y, exit_x, exit_y, _ in pairs:
+        positions.extend([(entry_x, entry_y), (exit_x, exit_y)])
+    if not all(on_arena(x, y) for x, y in positions):
+        raise SnapshotError("Position outside the arena")
+    if sum(pair[4] for pair in pairs) + unassigned != tail_length:
+        raise SnapshotError("Portal counts don't match the tail")
+
+    session = GameSession(context, size=size, mode=MODES[mode])
+    arena = session.arena
+    wizard = session.wizard
+    crystal = session.crystal
+
+    # Set state directly; the constructors' own rendering is overwritten
+    # by the saved arena below
+    for r, row in enumerate(arena.arena):
+        for c in range(size):
+            row[c * 2] = GLYPHS[cells[r * size + c]]
+
+    wizard._x, wizard._y = wx, wy
+    wizard._crystals = crystals
+    wizard._tail = [(tail_bytes[i], tail_bytes[i + 1]) for i in range(0, len(tail_bytes), 2)]
+    for entry_x, entry_y, exit_x, exit_y, segments in pairs:
+        wizard.portals.open((entry_x, entry_y), (exit_x, exit_y), segments)
+    wizard.portals._unassigned = unassigned
+    crystal._x, crystal._y = crystal_x, crystal_y
+
+    rng_version, mt_state, has_gauss, gauss_next = rng[0], rng[1:626], rng[626], rng[627]
+    try:
+        random.setstate((rng_version, tuple(mt_state), gauss_next if has_gauss else None))
+    except (TypeError, ValueError) as e:
+        raise SnapshotError(f"Bad random state: {e}")
+
+    return session
+
+
+def save(session: GameSession, path: str) -> None:
+    """Write a snapshot atomically: a crash leaves either the old or the new one."""
+    data = dump(session)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".snap-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_file(context, path: str):
+    """Load a saved game, or None if there isn't a usable one."""
+    try:
+        with open(path, "rb") as file:
+            return load(context, file.read())
+    except (OSError, SnapshotError):
+        return None
+
+
+def discard(path: str) -> None:
+    """Remove a saved game once it has finished."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Autosave:
+    """Saves the game every few moves."""
+
+    def __init__(self, path: str, every: int = SAVE_EVERY):
+        self.path = path
+        self.every = every
+        self._last_saved_move = 0
+
+    def moved(self, session: GameSession) -> None:
+        if session.running and session.moves - self._last_saved_move >= self.every:
+            self.save(session)
+
+    def save(self, session: GameSession) -> None:
+        try:
+            save(session, self.path)
+            self._last_saved_move = session.moves
+        except OSError as e:
+            # A failed save shouldn't end the game
+            print(f"Error saving game: {e}")
+
+
+@contextmanager
+def save_on_hangup(session: GameSession, autosave: Autosave):
+    """Save the game and exit if the SSH connection drops (SIGHUP)."""
+    if not hasattr(signal, "SIGHUP"):
+        yield
+        return
+
+    def handler(signum, frame):
+        if session.updating:
+            # Partway through a move; the session saves once it's finished
+            session.hung_up = True
+            return
+        autosave.save(session)
+        raise SystemExit(0)
+
+    previous = signal.signal(signal.SIGHUP, handler)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+
+
+def test_snapshot():
+    """Round-trip a game through a snapshot and time dump and load."""
+    import io
+    import timeit
+    from blessed import Terminal
+    from blessed.keyboard import Keystroke
+    from idle import IdleMonitor
+    from output import FrameWriter
+
+    class Context:
+        term = Terminal(stream=io.StringIO(), force_styling=True)
+        writer = FrameWriter(io.StringIO())
+        idle = IdleMonitor(term, writer, state_dir=None)
+
+    context = Context()
+    random.seed(7)
+    session = GameSession(context, size=10)
+    # A tail long enough to still be draining through two portal pairs
+    session.wizard._crystals = 6
+    session.wizard._add_segment(session.wizard.position)
+    for key in "jjjjlllkkkllll$jj0":
+        session.handle_key(Keystroke(key))
+    assert len(session.wizard.portals) == 2
+
+    data = dump(session)
+    random_before = random.random()
+    restored = load(context, data)
+    assert dump(restored) == data
+    assert random.random() == random_before
+
+    assert repr(restored.arena) == repr(session.arena)
+    assert restored.wizard.position == session.wizard.position
+    assert restored.wizard._tail == session.wizard._tail
+    assert [(pair.entry, pair.exit, pair.segments) for pair in restored.wizard.portals] == \
+        [(pair.entry, pair.exit, pair.segments) for pair in session.wizard.portals]
+    assert restored.wizard.portals.unassigned == session.wizard.portals.unassigned
+    assert restored.crystal.position == session.crystal.position
+
+    # Damaged snapshots are rejected rather than crashing the session
+    state_at = HEADER.size
+    cells_at = len(data) - RNG_STATE.size - 100
+    damaged = [
+        b"nope",
+        data[:6] + bytes([len(MODES)]) + data[7:],
+        data[:cells_at] + bytes([len(GLYPHS)]) + data[cells_at + 1:],
+        data[:state_at] + bytes([200]) + data[state_at + 1:],
+        data[:5] + bytes([2]) + data[6:],
+    ]
+    for bad in damaged:
+        try:
+            load(context, bad)
+        except SnapshotError:
+            pass
+        else:
+            raise AssertionError("Bad snapshot was accepted")
+
+    # A hangup mid-move is saved once the move has finished
+    if hasattr(signal, "SIGHUP"):
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            autosave = session.autosave = Autosave(os.path.join(directory, "hup.snap"))
+            with save_on_hangup(session, autosave):
+                session.updating = True
+                os.kill(os.getpid(), signal.SIGHUP)
+                assert session.hung_up and not os.path.exists(autosave.path)
+                try:
+                    session._update(lambda: None)
+                except SystemExit:
+                    pass
+                else:
+                    raise AssertionError("Hangup didn't end the session")
+            assert load_file(context, autosave.path) is not None
+
+    # Only saves whose session has ended can be resumed, and only once
+    import subprocess
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        ended = subprocess.Popen(["true"])
+        ended.wait()
+        orphan = save_path(directory, pid=ended.pid)
+        save(session, orphan)
+        save(session, save_path(directory))
+        # Only <client>-<pid>.snap is a session's save
+        save(session, os.path.join(directory, f"{client_name()}.snap"))
+        assert resumable_saves(directory) == [orphan]
+
+        assert resume(context, save_path(directory), directory) is not None
+        assert not os.path.exists(orphan)
+        assert resumable_saves(directory) == []
+
+    runs = 1000
+    dump_ms = timeit.timeit(lambda: dump(session), number=runs) / runs * 1000
+    load_ms = timeit.timeit(lambda: load(context, data), number=runs) / runs * 1000
+    print(f"Snapshot size: {len(data)} bytes")
+    print(f"Snapshot: {dump_ms:.3f} ms, restore: {load_ms:.3f} ms")
+    assert dump_ms < 1 and load_ms < 1, "Snapshot or restore took over a millisecond"
+    print("Snapshot test passed.")
+
+
+if __name__ == "__main__":
+    test_snapshot()